@@ -1,25 +1,44 @@
 # app.py
 import os
-import sqlite3
-import base64
-import cv2
-import face_recognition
-import numpy as np
+import threading
+import time
 from datetime import datetime, date
 from flask import (
     Flask, render_template, request, redirect, url_for, flash,
-    send_file, g, jsonify, Response
+    send_file, jsonify, Response, abort, session
 )
-from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 
 # Local imports
-from modules.utils import init_db, get_db, load_all_encodings
-from modules.face_registration import register_student_and_encode
+# (cv2 / face_recognition / pandas are imported lazily by the code that needs them,
+#  so the login page is up before the vision stack has finished loading)
+from modules.startup import timed, record, startup_report, print_startup_report
+from modules.gallery import Gallery
+from modules.shared_gallery import SharedGallery
+from modules.storage import open_storage, import_pickled_encodings
+from modules.shards import ShardRouter, parse_shards
+from modules.attendance_policy import load_policy, set_policy
+from modules.face_registration import register_student_and_encode, register_student_with_encoding
+from modules.unknown_faces import UnknownFaces
+from modules.camera import CameraManager, parse_source
+from modules.motion import MotionGate
+from modules.capture_schedule import CaptureScheduler, ResourceGovernor, FramePacer
+from modules.detectors import make_detector
+from modules.face_quality import QualityGate
 from modules.export_data import export_attendance_csv, export_attendance_excel
-from modules.student_management import get_all_students, delete_student
-from flask import Flask, render_template, request, redirect, url_for, flash, get_flashed_messages
-from werkzeug.security import check_password_hash, generate_password_hash
+from modules.student_management import delete_student, list_students, ensure_student_indexes
+from modules.photo_store import (
+    THUMB_SIZES, store_photo, set_student_photo, remove_if_unreferenced,
+    thumb_path, backfill_photos
+)
+from modules.static_assets import StaticAssets
+from modules.event_log import EventLog
+from modules.archive import run_archival, attendance_report, schedule_daily
+from modules.live_events import EventHub
+from modules.recognition import (
+    RecognitionEngine, StorageSink, CSVSink, ConsecutivePolicy, EvidencePolicy, LivenessPolicy, AllOf, draw_results,
+    warm_up, is_warm
+)
 
 # ---------- Folder setup ----------
 BASE = os.path.abspath(os.path.dirname(__file__))
@@ -33,77 +52,149 @@ os.makedirs(DB_DIR, exist_ok=True)
 os.makedirs(ATT_DIR, exist_ok=True)
 
 # ---------- Flask App ----------
-app = Flask(__name__)
+app = Flask(__name__, static_folder=None)   # /static is served by the asset pipeline below
 app.secret_key = "replace-this-with-a-strong-secret-key"
 DATABASE_PATH = os.path.join(DB_DIR, "attendance.db")
+# Late cutoffs (default / per weekday / per class / per date), shared by live marking and exports
+POLICY_PATH = os.path.join(BASE, "attendance_policy.json")
+set_policy(load_policy(POLICY_PATH))
 
-# ---------- Initialize DB ----------
-init_db(DATABASE_PATH)
+# ---------- Static assets ----------
+# Content-hashed copies (+ .gz/.br) of static/, served with a one-year immutable
+# Cache-Control; url_for('static', filename=...) in templates picks the hashed name.
+STATIC_BUILD_DIR = os.path.join(BASE, "static_build")
+static_assets = StaticAssets(os.path.join(BASE, "static"), STATIC_BUILD_DIR)
+with timed("static_assets"):
+    static_assets.build()
 
-# ---------- Ensure attendance table has 'status' column ----------
-def ensure_attendance_status_column(db_path):
-    """
-    Make sure attendance table has a 'status' TEXT column.
-    If missing, add it with ALTER TABLE (safe, preserves data).
-    """
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    try:
-        cur.execute("PRAGMA table_info(attendance)")
-        cols = [r[1] for r in cur.fetchall()]  # second field is column name
-        if 'status' not in cols:
-            # Add column (default NULL). SQLite allows ADD COLUMN for simple cases.
-            cur.execute("ALTER TABLE attendance ADD COLUMN status TEXT")
-            conn.commit()
-            print("✅ Added 'status' column to attendance table.")
 
-    except Exception as e:
-        print(f"⚠️ Could not verify/add 'status' column: {e}")
-    finally:
-        conn.close()
+@app.url_defaults
+def fingerprint_static(endpoint, values):
+    if endpoint == "static" and "filename" in values:
+        values["filename"] = static_assets.url_name(values["filename"])
 
-# call the schema-fixer right after init_db
-ensure_attendance_status_column(DATABASE_PATH)
 
+@app.route("/static/<path:filename>", endpoint="static")
+def static_file(filename):
+    return static_assets.serve(filename, request.headers.get("Accept-Encoding", ""))
 
-# ---------- Globals ----------
-known_face_encodings, known_face_ids, known_face_names = load_all_encodings(ENC_DIR)
-camera = None  # Global camera object
 
+# ---------- Storage ----------
+# Users, students, photos, attendance and the encoding gallery (schema and column
+# migrations are applied on open); set PVP_STORAGE_URL=postgresql://... to run
+# several gate servers against one database.
+STORAGE_URL = os.environ.get("PVP_STORAGE_URL") or f"sqlite:///{DATABASE_PATH}"
+with timed("open_storage"):
+    storage = open_storage(STORAGE_URL)
+if storage.dialect == "sqlite":
+    with timed("ensure_student_indexes"):
+        ensure_student_indexes(storage.db_path)
 
-# ---------- Before/After request ----------
-@app.before_request
-def before_request():
-    g.db = get_db(DATABASE_PATH)
 
+# ---------- Globals ----------
+# Gallery loads in a background thread; /readyz reports when it is done.
+# Worker processes share one read-only mmap of it (published once per gallery version).
+SHARED_GALLERY_DIR = os.environ.get("PVP_SHARED_GALLERY_DIR") or os.path.join(BASE, "gallery_cache")
+gallery = Gallery(ENC_DIR, storage=storage, shared=SharedGallery(SHARED_GALLERY_DIR))
 
-@app.teardown_request
-def teardown_request(exception):
-    db = getattr(g, 'db', None)
-    if db:
-        db.close()
+
+def _load_gallery():
+    try:
+        import_pickled_encodings(storage, ENC_DIR)
+    except Exception as e:
+        print(f"⚠️ Could not import encodings into the shared gallery: {e}")
+    gallery.load()
+
+
+threading.Thread(target=_load_gallery, name="gallery-load", daemon=True).start()
+# students registered before the photo store get resized copies + thumbnails
+threading.Thread(target=backfill_photos, args=(storage, KNOWN_DIR), daemon=True).start()
+# Marks go to an fsync'd event log first, then are replayed into the attendance
+# table and the per-day CSVs; a locked/unavailable DB never loses a mark.
+EVENT_LOG_DIR = os.path.join(BASE, "event_log")
+# Open dashboards get new marks + counters pushed over SSE (/events/stream)
+live_hub = EventHub()
+
+
+def _publish_marks(batch):
+    """Event log listener: one counters query per batch, however many screens are open."""
+    for ev in batch:
+        live_hub.publish("mark", {k: ev[k] for k in ("token_no", "name", "date", "time", "status")})
+    if len(live_hub):
+        for day in sorted({ev["date"] for ev in batch}):
+            live_hub.publish("counters", dict(storage.day_counts(day), date=day))
+
+
+event_log = EventLog(EVENT_LOG_DIR, [StorageSink(storage), CSVSink(ATT_DIR)], listeners=[_publish_marks])
+event_log.start()   # replays anything left over from the last run
+# Nightly: days older than ARCHIVE_KEEP_DAYS move from the attendance table into
+# partitioned Parquet (needs pyarrow); reports read both (/api/analytics/attendance)
+ARCHIVE_DIR = os.environ.get("PVP_ARCHIVE_DIR") or os.path.join(BASE, "archive")
+ARCHIVE_KEEP_DAYS = int(os.environ.get("PVP_ARCHIVE_KEEP_DAYS", "30"))
+ARCHIVE_RETAIN_YEARS = int(os.environ.get("PVP_ARCHIVE_RETAIN_YEARS", "0")) or None   # None = keep forever
+ARCHIVE_AT_HOUR = 2
+
+
+def archive_attendance():
+    return run_archival(storage, ARCHIVE_DIR, ARCHIVE_KEEP_DAYS, ARCHIVE_RETAIN_YEARS,
+                        csv_dir=ATT_DIR, event_log=event_log)
+
+
+schedule_daily(archive_attendance, ARCHIVE_AT_HOUR)
+# Unmatched faces from the live feed, clustered into enrolment suggestions (/unknown)
+unknown_faces = UnknownFaces()
+# Latest-frame capture with MJPEG/resolution negotiation and auto-reconnect (modules/camera.py).
+# PVP_CAMERA_SOURCE picks a device index or a video file / image folder (fake device).
+camera = CameraManager(parse_source(os.environ.get("PVP_CAMERA_SOURCE", "")))
+live_engine = None  # RecognitionEngine of this camera, shared by every /video_feed viewer
+live_pacer = None   # its FramePacer (schedule mode, frames recognised)
+live_lock = threading.Lock()
+live_state = {"seq": 0, "results": [], "at": 0.0, "pause": 0.0}   # last recognised camera frame
+# This gate's camera; its schedule in camera_shards picks the gallery shard to search first
+CAMERA_ID = os.environ.get("PVP_CAMERA_ID", "main")
+# Load + warm the dlib models in the background at boot instead of on the first frame
+WARM_UP_ON_BOOT = True
+# Require blink + R->L head movement on the live feed before marking attendance
+LIVENESS_ON_LIVE_FEED = False
+# Confirm by accumulated match evidence (strong matches in 1 frame) instead of N frames in a row
+EVIDENCE_CONFIRMATION = True
+# Skip face detection on static frames (empty corridor) and detect only where something moved
+MOTION_GATE_ON_LIVE_FEED = True
+# Face detector for the live feed, e.g. "hog", "haar", "yunet", "cascade:haar>hog" (modules/detectors.py)
+DETECTOR = os.environ.get("PVP_DETECTOR") or "hog"
+# Encode only faces that are big / sharp / well lit / frontal enough (pose check off with liveness,
+# whose challenge is a head turn)
+QUALITY_GATE_ON_LIVE_FEED = True
+# Full recognition rate only around session starts (this camera's timetable, or the late cutoff),
+# low rate during the day, idle at night; all cameras of this process back off when CPU/RAM is saturated
+CAPTURE_SCHEDULE_ON_LIVE_FEED = True
+governor = ResourceGovernor()
 
 
 # ---------- Ensure default users ----------
 def ensure_default_users():
-    db = get_db(DATABASE_PATH)
-    cur = db.cursor()
-    cur.execute("SELECT username FROM users")
-    existing = [r[0] for r in cur.fetchall()]
-
     users = [
         ("admin", "admin123", "admin"),
     ]
 
     for username, password, role in users:
-        if username not in existing:
-            pwd = generate_password_hash(password)
-            cur.execute("INSERT INTO users(username, password_hash, role) VALUES (?, ?, ?)",
-                        (username, pwd, role))
-    db.commit()
+        if storage.get_user(username) is None:
+            storage.add_user(username, generate_password_hash(password), role)
 
 
-ensure_default_users()
+with timed("ensure_default_users"):
+    ensure_default_users()
+
+
+def _warm_up_worker():
+    try:
+        record("model warm-up (background)", warm_up())
+    except Exception as e:
+        print(f"⚠️ Model warm-up failed: {e}")
+
+
+if WARM_UP_ON_BOOT:
+    threading.Thread(target=_warm_up_worker, name="model-warm-up", daemon=True).start()
 
 
 # ---------- Helper for login ----------
@@ -118,8 +209,70 @@ def index():
     """Show main landing page"""
     return render_template("index.html")
 
+# ---------- Health / readiness ----------
+@app.route("/healthz")
+def healthz():
+    """Process is up and serving requests (login page works)."""
+    return jsonify({"status": "ok"})
+
+
+@app.route("/readyz")
+def readyz():
+    """Ready for recognition once the gallery has loaded; includes the startup breakdown."""
+    ready = gallery.ready.is_set()
+    body = {
+        "ready": ready,
+        "gallery_size": len(gallery),
+        "gallery_version": gallery.version,
+        "models_warm": is_warm(),
+        "startup": startup_report(),
+        "recognition_latency": live_engine.latency.report() if live_engine else None,
+        "motion_gate": live_engine.motion_gate.stats() if live_engine and live_engine.motion_gate else None,
+        "quality_gate": live_engine.quality_gate.stats() if live_engine and live_engine.quality_gate else None,
+        "event_log_lag": event_log.lag(),
+        "capture": camera.stats() if camera.running else None,
+        "capture_schedule": live_pacer.stats() if live_pacer else None,
+        "governor": governor.stats(),
+    }
+    return jsonify(body), (200 if ready else 503)
+
+
+# ---------- Student photo thumbnails ----------
+# Student faces: only the logged-in browser may keep them (never a shared proxy),
+# and only for a day, so a signed-out machine doesn't hold the roster for a year.
+THUMB_MAX_AGE = 86400
+
+
+@app.route("/photos/thumb/<photo_hash>/<int:size>")
+def photo_thumb(photo_hash, size):
+    """Thumbnails are content-addressed, so a URL never changes meaning: immutable while cached."""
+    if not require_login():
+        abort(401)
+    if size not in THUMB_SIZES or not photo_hash.isalnum():
+        abort(404)
+    path = thumb_path(KNOWN_DIR, photo_hash, size)
+    if not os.path.exists(path):
+        abort(404)
+    resp = send_file(path, mimetype="image/jpeg", max_age=THUMB_MAX_AGE, conditional=True,
+                     etag=f"{photo_hash}-{size}")
+    resp.cache_control.public = False      # send_file marks anything with a max_age public
+    resp.cache_control.private = True
+    resp.cache_control.immutable = True
+    return resp
+
+
+# Endpoints that set their own caching headers and must not get no-store
+CACHEABLE_ENDPOINTS = {"static", "photo_thumb"}
+
+
 @app.after_request
 def add_header(response):
+    if request.endpoint in CACHEABLE_ENDPOINTS:
+        return response
+    if not require_login() and "Set-Cookie" not in response.headers:
+        # public pages (landing, login, health): may be kept, but always revalidated
+        response.headers["Cache-Control"] = "no-cache"
+        return response
     # har response par cache band karega
     response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     response.headers["Pragma"] = "no-cache"
@@ -133,10 +286,7 @@ def login():
         username = request.form.get("username")
         password = request.form.get("password")
 
-        db = get_db(DATABASE_PATH)
-        cur = db.cursor()
-        cur.execute("SELECT id, username, password_hash, role FROM users WHERE username=?", (username,))
-        row = cur.fetchone()
+        row = storage.get_user(username)
 
         if row and check_password_hash(row[2], password):
             role = row[3]
@@ -166,126 +316,44 @@ def logout():
 
 
 # ---------- Dashboards ----------
-@app.route("/dashboard/student")
-def student_dashboard():
+def _dashboard(template):
+    """Shared body of the three dashboards (counters come from the storage backend)."""
     if not require_login():
         return redirect(url_for("login"))
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    # ✅ Total students
-    cursor.execute("SELECT COUNT(*) FROM students")
-    total_students = cursor.fetchone()[0]
-
     # ✅ Get today's date (string)
     today = datetime.now().strftime("%Y-%m-%d")
 
-    # ✅ Present students today
-    cursor.execute("SELECT COUNT(DISTINCT token_no) FROM attendance WHERE date=?", (today,))
-    present_today = cursor.fetchone()[0]
+    # ✅ Total / present / absent / percentage + today's records
+    summary = storage.day_summary(today)
 
-    # ✅ Absent & percentage
-    absent_today = total_students - present_today if total_students > 0 else 0
-    average_percentage = round((present_today / total_students) * 100, 1) if total_students > 0 else 0
+    return render_template(template, current_date=today, **summary)
 
-    # ✅ Get student attendance records for today
-    cursor.execute("SELECT token_no, name, time FROM attendance WHERE date=?", (today,))
-    records = cursor.fetchall()
-    present_students = [{"token_no": r[0], "name": r[1], "time": r[2]} for r in records]
 
-    conn.close()
+@app.route("/dashboard/student")
+def student_dashboard():
+    return _dashboard("student_dashboard.html")
 
-    return render_template(
-        "student_dashboard.html",
-        total_students=total_students,
-        present_today=present_today,
-        absent_today=absent_today,
-        average_percentage=average_percentage,
-        present_students=present_students,
-        current_date=today
-    )
 
 @app.route("/dashboard/teacher")
 def teacher_dashboard():
-    if not require_login():
-        return redirect(url_for("login"))
-
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-
-    # ✅ Total students
-    cursor.execute("SELECT COUNT(*) FROM students")
-    total_students = cursor.fetchone()[0]
-
-    # ✅ Get today's date (string)
-    today = datetime.now().strftime("%Y-%m-%d")
+    return _dashboard("teacher_dashboard.html")
 
-    # ✅ Present students today
-    cursor.execute("SELECT COUNT(DISTINCT token_no) FROM attendance WHERE date=?", (today,))
-    present_today = cursor.fetchone()[0]
-
-    # ✅ Absent & percentage
-    absent_today = total_students - present_today if total_students > 0 else 0
-    average_percentage = round((present_today / total_students) * 100, 1) if total_students > 0 else 0
-
-    # ✅ Get student attendance records for today
-    cursor.execute("SELECT token_no, name, time FROM attendance WHERE date=?", (today,))
-    records = cursor.fetchall()
-    present_students = [{"token_no": r[0], "name": r[1], "time": r[2]} for r in records]
-
-    conn.close()
-
-    return render_template(
-        "teacher_dashboard.html",
-        total_students=total_students,
-        present_today=present_today,
-        absent_today=absent_today,
-        average_percentage=average_percentage,
-        present_students=present_students,
-        current_date=today
-    )
 
 @app.route("/dashboard/admin")
 def admin_dashboard():
-    if not require_login():
-        return redirect(url_for("login"))
+    return _dashboard("admin_dashboard.html")
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
 
-    # ✅ Total students
-    cursor.execute("SELECT COUNT(*) FROM students")
-    total_students = cursor.fetchone()[0]
-
-    # ✅ Get today's date (string)
-    today = datetime.now().strftime("%Y-%m-%d")
-
-    # ✅ Present students today
-    cursor.execute("SELECT COUNT(DISTINCT token_no) FROM attendance WHERE date=?", (today,))
-    present_today = cursor.fetchone()[0]
-
-    # ✅ Absent & percentage
-    absent_today = total_students - present_today if total_students > 0 else 0
-    average_percentage = round((present_today / total_students) * 100, 1) if total_students > 0 else 0
-
-    # ✅ Get student attendance records for today
-    cursor.execute("SELECT token_no, name, time FROM attendance WHERE date=?", (today,))
-    records = cursor.fetchall()
-    present_students = [{"token_no": r[0], "name": r[1], "time": r[2]} for r in records]
-
-    conn.close()
-
-    return render_template(
-        "admin_dashboard.html",
-        total_students=total_students,
-        present_today=present_today,
-        absent_today=absent_today,
-        average_percentage=average_percentage,
-        present_students=present_students,
-        current_date=today
-    )
 
+@app.route("/events/stream")
+def events_stream():
+    """Server-Sent Events: new marks and updated counters for the dashboards / view_attendance."""
+    if not require_login():
+        abort(401)
+    q = live_hub.subscribe()
+    return Response(live_hub.stream(q), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 # ---------- Register Student ----------
@@ -294,29 +362,32 @@ def register():
     if not require_login():
         return redirect(url_for("login"))
 
-    global known_face_encodings, known_face_ids, known_face_names
-
     if request.method == "POST":
         name = request.form.get("name", "").strip()
         token_no = request.form.get("token_no", "").strip()
+        shards = parse_shards(request.form.get("shards"))
         photo = request.files.get("photo")
 
         if not (name and token_no and photo and photo.filename):
             flash("❌ Fill name, token AND capture photo first!", "error")
             return redirect(url_for("register"))
 
-        filename = secure_filename(f"{token_no}_{name}.jpg")
-        save_path = os.path.join(KNOWN_DIR, filename)
-        photo.save(save_path)
-
+        photo_hash = None
         try:
-            success = register_student_and_encode(DATABASE_PATH, save_path, token_no, name, ENC_DIR)
+            # size-capped, deduplicated original + thumbnails (modules/photo_store.py)
+            photo_hash, save_path = store_photo(photo.read(), KNOWN_DIR)
+            success = register_student_and_encode(storage, save_path, token_no, name, ENC_DIR)
             if success:
+                set_student_photo(storage, token_no, photo_hash, save_path)
+                if shards:
+                    storage.set_student_shards(token_no, shards)
                 flash("✅ Student registered successfully!", "success")
-                known_face_encodings, known_face_ids, known_face_names = load_all_encodings(ENC_DIR)
+                gallery.refresh()
             else:
+                remove_if_unreferenced(storage, KNOWN_DIR, photo_hash)
                 flash(f"❌ Token {token_no} already registered!", "error")
         except Exception as e:
+            remove_if_unreferenced(storage, KNOWN_DIR, photo_hash)
             flash(f"❌ Error: {str(e)}", "error")
 
         return redirect(url_for("register"))
@@ -326,51 +397,190 @@ def register():
 
 
 # ---------- Student Management ----------
+STUDENTS_PAGE_SIZE = 50
+
+
+def _student_json(row):
+    token_no, name, _photo_path, photo_hash = row
+    thumb = url_for("photo_thumb", photo_hash=photo_hash, size=64) if photo_hash else None
+    return {
+        "token_no": token_no,
+        "name": name,
+        "thumb": thumb,
+        "edit_url": url_for("edit_student", token_no=token_no),
+        "delete_url": url_for("delete_student_route", token_no=token_no),
+    }
+
+
 @app.route("/students")
 def students():
-    students_list = get_all_students(DATABASE_PATH)
-    return render_template("student_management.html", students=students_list)
+    # first page is rendered server-side; the rest is loaded from /api/students
+    q = request.args.get("q", "").strip()
+    students_list, next_cursor = list_students(storage, q=q, limit=STUDENTS_PAGE_SIZE)
+    return render_template("student_management.html", students=students_list,
+                           next_cursor=next_cursor, q=q)
+
+
+@app.route("/api/students")
+def api_students():
+    """Keyset-paginated roster: ?q=prefix&after_name=..&after_token=..&limit=.."""
+    if not require_login():
+        return jsonify(error="login required"), 401
+    q = request.args.get("q", "").strip()
+    after = None
+    if request.args.get("after_token") is not None:
+        after = (request.args.get("after_name", ""), request.args.get("after_token"))
+    limit = request.args.get("limit", STUDENTS_PAGE_SIZE, type=int)
+    rows, next_cursor = list_students(storage, q=q, after=after, limit=limit)
+    nxt = {"after_name": next_cursor[0], "after_token": next_cursor[1]} if next_cursor else None
+    return jsonify({"students": [_student_json(r) for r in rows], "next": nxt})
 
 
 @app.route("/edit_student/<token_no>", methods=["GET", "POST"])
 def edit_student(token_no):
-    conn = sqlite3.connect(DATABASE_PATH)
-    c = conn.cursor()
     if request.method == "POST":
         name = request.form.get("name")
         new_token = request.form.get("token_no")
 
         if new_token and new_token != token_no:
-            c.execute("SELECT token_no FROM students WHERE token_no=?", (new_token,))
-            if c.fetchone():
+            if storage.get_student(new_token):
                 flash("Token No already exists.", "danger")
-                conn.close()
                 return redirect(url_for("edit_student", token_no=token_no))
 
-        c.execute("UPDATE students SET token_no=?, name=? WHERE token_no=?", (new_token, name, token_no))
-        conn.commit()
-        conn.close()
+        # moves the gallery entry too, so recognition uses the new token/name
+        storage.rename_student(token_no, new_token or token_no, name)
+        storage.set_student_shards(new_token or token_no, parse_shards(request.form.get("shards")))
+        gallery.refresh()
         flash("Student updated successfully!", "delete")
         return redirect(url_for("students"))
 
-    c.execute("SELECT token_no, name, photo_path FROM students WHERE token_no=?", (token_no,))
-    student = c.fetchone()
-    conn.close()
+    student = storage.get_student(token_no)
 
     if not student:
         flash("Student not found!", "danger")
         return redirect(url_for("students"))
 
-    return render_template("edit_student.html", student=student)
+    return render_template("edit_student.html", student=student,
+                           shards=", ".join(storage.student_shards(token_no)))
 
 
 @app.route("/delete_student/<token_no>")
 def delete_student_route(token_no):
-    delete_student(DATABASE_PATH, token_no, KNOWN_DIR, ENC_DIR)
+    delete_student(storage, token_no, KNOWN_DIR, ENC_DIR)
+    gallery.refresh()
     flash("Student deleted successfully!", "delete")
     return redirect(url_for("students"))
 
 
+# ---------- Unknown faces ----------
+@app.route("/unknown")
+def unknown_faces_page():
+    if not require_login():
+        return redirect(url_for("login"))
+    min_count = request.args.get("min", 2, type=int)
+    return render_template("unknown_faces.html", clusters=unknown_faces.clusters(min_count), min_count=min_count)
+
+
+@app.route("/unknown/<int:cid>/crop.jpg")
+def unknown_crop(cid):
+    if not require_login():
+        abort(401)
+    data = unknown_faces.crop_jpeg(cid)
+    if data is None:
+        abort(404)
+    return Response(data, mimetype="image/jpeg")
+
+
+@app.route("/unknown/<int:cid>/enrol", methods=["POST"])
+def unknown_enrol(cid):
+    """Register a cluster as a student from its stored crop + mean encoding (no re-encoding)."""
+    if not require_login():
+        return redirect(url_for("login"))
+    name = request.form.get("name", "").strip()
+    token_no = request.form.get("token_no", "").strip()
+    cluster = unknown_faces.get(cid)
+    crop = unknown_faces.crop_jpeg(cid)
+    if cluster is None or crop is None:
+        flash("❌ That unknown face is no longer in the buffer.", "error")
+        return redirect(url_for("unknown_faces_page"))
+    if not (name and token_no):
+        flash("❌ Fill name and token first!", "error")
+        return redirect(url_for("unknown_faces_page"))
+
+    photo_hash = None
+    try:
+        photo_hash, save_path = store_photo(crop, KNOWN_DIR)
+        if register_student_with_encoding(storage, save_path, token_no, name, ENC_DIR, cluster.encoding()):
+            set_student_photo(storage, token_no, photo_hash, save_path)
+            unknown_faces.discard(cid)
+            gallery.refresh()
+            flash(f"✅ {name} enrolled from the live feed!", "success")
+        else:
+            remove_if_unreferenced(storage, KNOWN_DIR, photo_hash)
+            flash(f"❌ Token {token_no} already registered!", "error")
+    except Exception as e:
+        remove_if_unreferenced(storage, KNOWN_DIR, photo_hash)
+        flash(f"❌ Error: {str(e)}", "error")
+    return redirect(url_for("unknown_faces_page"))
+
+
+@app.route("/unknown/<int:cid>/discard", methods=["POST"])
+def unknown_discard(cid):
+    if not require_login():
+        return redirect(url_for("login"))
+    unknown_faces.discard(cid)
+    return redirect(url_for("unknown_faces_page"))
+
+
+# ---------- Camera -> shard schedules ----------
+@app.route("/api/cameras/<camera_id>/schedule", methods=["GET", "POST"])
+def camera_schedule(camera_id):
+    """
+    GET: the camera's shard schedule. POST (JSON list): replace it, e.g.
+    [{"shard": "CS-A", "weekday": "Mon", "start": "09:00:00", "end": "10:00:00"}]
+    """
+    if not require_login():
+        return jsonify({"error": "login required"}), 401
+    if request.method == "POST":
+        entries = request.get_json(silent=True)
+        if not isinstance(entries, list) or not all(isinstance(e, dict) and e.get("shard") for e in entries):
+            return jsonify({"error": "expected a list of {shard, weekday, start, end}"}), 400
+        storage.set_camera_schedule(camera_id, entries)
+    return jsonify(storage.camera_schedule(camera_id))
+
+
+# ---------- Attendance analytics / archive ----------
+@app.route("/api/analytics/attendance")
+def analytics_attendance():
+    """
+    Per-day and per-student present / late counts over ?from=YYYY-MM-DD&to=YYYY-MM-DD
+    (optionally &token_no=), archived and current rows together.
+    """
+    if not require_login():
+        return jsonify({"error": "login required"}), 401
+    today = datetime.now().strftime("%Y-%m-%d")
+    start, end = request.args.get("from") or today, request.args.get("to") or today
+    try:
+        datetime.strptime(start, "%Y-%m-%d"), datetime.strptime(end, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+    try:
+        return jsonify(attendance_report(storage, ARCHIVE_DIR, start, end, request.args.get("token_no") or None))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 501
+
+
+@app.route("/api/archive/run", methods=["POST"])
+def archive_run():
+    """Run the nightly archival now."""
+    if not require_login():
+        return jsonify({"error": "login required"}), 401
+    try:
+        return jsonify(archive_attendance())
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 501
+
+
 # ---------- Live Attendance ----------
 @app.route("/attendance/live")
 def live_attendance():
@@ -387,187 +597,94 @@ def start_attendance():
 
 
 # ---------- MJPEG Stream Route ----------
-# (gen_frames unchanged from your working version)
+def _live_pipeline():
+    """This camera's engine + pacer, built by the first viewer and shared by the rest."""
+    global live_engine, live_pacer
+
+    with live_lock:
+        if live_engine is None:
+            policy = EvidencePolicy() if EVIDENCE_CONFIRMATION else ConsecutivePolicy()
+            if LIVENESS_ON_LIVE_FEED:
+                policy = AllOf(policy, LivenessPolicy())
+            quality_gate = None
+            if QUALITY_GATE_ON_LIVE_FEED:
+                # liveness turns the head (no pose rejection) and needs eye contours (68-point landmarks)
+                quality_gate = QualityGate(check_pose=not LIVENESS_ON_LIVE_FEED,
+                                           landmark_model="large" if LIVENESS_ON_LIVE_FEED else "small")
+            live_engine = RecognitionEngine(
+                gallery.snapshot,
+                sinks=[event_log],
+                policy=policy,
+                shard_router=ShardRouter(storage, CAMERA_ID),
+                get_members=gallery.members,
+                unknown_sink=unknown_faces,
+                motion_gate=MotionGate() if MOTION_GATE_ON_LIVE_FEED else None,
+                detector=make_detector(DETECTOR),
+                quality_gate=quality_gate,
+            )
+            if CAPTURE_SCHEDULE_ON_LIVE_FEED:
+                live_pacer = FramePacer(CaptureScheduler(storage, CAMERA_ID), governor)
+        return live_engine, live_pacer
+
+
 def gen_frames():
     """
     Robust frame generator:
-     - tries to open camera on indices 0..3
-     - works on a resized frame for speed
-     - requires same recognized token_no in N consecutive frames before inserting attendance
-     - reloads encodings from disk if empty (useful after new registrations)
+     - takes the newest frame from the CameraManager (opens / reconnects the device itself)
+     - runs the shared RecognitionEngine (modules/recognition.py) at the rate the capture
+       schedule allows (every frame around session starts, a few per second otherwise)
+     - confirms a token once enough match evidence has accumulated before inserting attendance
+     - refreshes the gallery from the shared store (useful after new registrations)
     """
-    global camera, known_face_encodings, known_face_ids, known_face_names
+    import cv2
 
-    # Try to open camera if not already opened
-    if camera is None or not getattr(camera, "isOpened", lambda: False)():
-        camera = None
-        for i in range(0, 4):
-            try:
-                cap = cv2.VideoCapture(i, cv2.CAP_DSHOW) if os.name == "nt" else cv2.VideoCapture(i)
-            except Exception:
-                cap = cv2.VideoCapture(i)
-            if cap is not None and cap.isOpened():
-                camera = cap
-                print(f"✅ Camera opened at index {i}")
-                break
-            else:
-                try:
-                    cap.release()
-                except Exception:
-                    pass
-        if camera is None:
-            print("❌ Could not open any camera (indices 0..3).")
-            return
-
-    db = get_db(DATABASE_PATH)
-
-    # parameters
-    LATE_THRESHOLD = "09:15:00"
-    tolerance = 0.5
-    REQUIRED_CONSECUTIVE = 3  # require N consecutive matches before marking attendance
-
-    # state for consecutive detection { token_no: count }
-    consecutive_counts = {}
-    # last seen timestamp to decay old counts
-    last_seen_ts = {}
-
-    # reload timing
+    camera.start()
+    engine, pacer = _live_pipeline()
+
+    # gallery refresh timing
     last_reload = 0
     RELOAD_INTERVAL = 5.0  # seconds
 
     print("🔎 gen_frames started.")
 
     while True:
-        # If encodings list is empty, try reload periodically
-        try:
-            if (not known_face_encodings) or len(known_face_encodings) == 0:
-                now_ts_try = datetime.now().timestamp()
-                if now_ts_try - last_reload > RELOAD_INTERVAL:
-                    try:
-                        encs, ids, names = load_all_encodings(ENC_DIR)
-                        # ensure dtype/numpy arrays
-                        if encs:
-                            known_face_encodings = [np.array(e) for e in encs]
-                            known_face_ids = ids
-                            known_face_names = names
-                        print(f"🔁 Reloaded encodings: {len(known_face_encodings)}")
-                    except Exception as e:
-                        print(f"⚠️ Error reloading encodings: {e}")
-                    last_reload = now_ts_try
-        except Exception as e:
-            print(f"⚠️ Encoding reload check failed: {e}")
-
-        success, frame = camera.read()
-        if not success:
-            print("❌ camera.read() failed.")
-            break
-
-        # Resize for speed and easier coordinate scaling
-        small = cv2.resize(frame, (0, 0), fx=0.5, fy=0.5)
-        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
-
-        # detect faces & encodings on small frame
-        face_locations = face_recognition.face_locations(rgb_small)
-        face_encodings = face_recognition.face_encodings(rgb_small, face_locations)
-
-        # debug prints so you can see terminal output
-        if len(face_locations) == 0:
-            # only print sometimes to avoid flooding
-            if int(datetime.now().timestamp()) % 5 == 0:
-                print("ℹ️ No faces detected in this frame.")
-        else:
-            print(f"👀 Faces detected: {len(face_locations)}")
-
-        # clean up stale counts older than 5 seconds
-        now_ts = datetime.now().timestamp()
-        stale_keys = [k for k, t in last_seen_ts.items() if now_ts - t > 5.0]
-        for k in stale_keys:
-            consecutive_counts.pop(k, None)
-            last_seen_ts.pop(k, None)
-
-        for encoding, loc in zip(face_encodings, face_locations):
-            # ensure we have known encodings
-            if len(known_face_encodings) == 0:
-                # draw yellow box to show face but no encodings available
-                top, right, bottom, left = [int(v * 2) for v in loc]
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 200, 200), 2)
-                cv2.putText(frame, "No known faces loaded", (left, top - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 200, 200), 2)
-                continue
-
-            # convert to numpy array if needed
-            enc = np.array(encoding)
-
-            # compare & find best match
+        # Pick up registrations/deletions (from any instance) via the gallery version counter
+        now_ts_try = datetime.now().timestamp()
+        if now_ts_try - last_reload > RELOAD_INTERVAL:
             try:
-                face_distances = face_recognition.face_distance(known_face_encodings, enc)
+                gallery.refresh()
             except Exception as e:
-                print(f"❌ face_distance error: {e}")
-                # try forcing conversion of known encodings
-                known_face_encodings = [np.array(k) for k in known_face_encodings]
-                face_distances = face_recognition.face_distance(known_face_encodings, enc)
-
-            if len(face_distances) == 0:
-                continue
-
-            best_idx = np.argmin(face_distances)
-            best_distance = float(face_distances[best_idx])
-            is_match = best_distance <= tolerance
-
-            print(f"🔎 best_distance={best_distance:.3f} (tolerance={tolerance})")
-
-            if not is_match:
-                # draw red box for non-match
-                top, right, bottom, left = [int(v * 2) for v in loc]
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
-                cv2.putText(frame, f"Unknown ({best_distance:.2f})", (left, top - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                continue
-
-            token_no = known_face_ids[best_idx]
-            name = known_face_names[best_idx]
-
-            # update consecutive counters
-            consecutive_counts[token_no] = consecutive_counts.get(token_no, 0) + 1
-            last_seen_ts[token_no] = now_ts
-
-            # if we have not reached required count yet, do not insert
-            if consecutive_counts[token_no] < REQUIRED_CONSECUTIVE:
-                top, right, bottom, left = [int(v * 2) for v in loc]
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 200, 200), 2)
-                cv2.putText(frame, f"{name} ({consecutive_counts[token_no]})", (left, top - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 200, 200), 2)
-                continue
-
-            # reached required consecutive frames -> attempt to insert once
-            today = date.today().isoformat()
-            now_time = datetime.now().strftime("%H:%M:%S")
-
-            cur = db.cursor()
-            # double-check no prior attendance for today (prevents race)
-            cur.execute("SELECT * FROM attendance WHERE token_no=? AND date=?", (token_no, today))
-            if cur.fetchone() is None:
-                status = "Late" if now_time > LATE_THRESHOLD else "On Time"
-                try:
-                    cur.execute(
-                        "INSERT INTO attendance(token_no, name, date, time, status) VALUES (?, ?, ?, ?, ?)",
-                        (token_no, name, today, now_time, status),
-                    )
-                    db.commit()
-                    print(f"✅ Inserted attendance: {token_no} | {name} | {status} | {now_time}")
-                    # reset so we don't re-insert immediately
-                    consecutive_counts[token_no] = 0
-                    last_seen_ts[token_no] = now_ts
-                except Exception as e:
-                    print(f"❌ DB insert failed: {e}")
-            else:
-                consecutive_counts[token_no] = 0
-                last_seen_ts[token_no] = now_ts
-
-            # draw green box for confirmed attendance
-            top, right, bottom, left = [int(v * 2) for v in loc]
-            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-            cv2.putText(frame, name, (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+                print(f"⚠️ Error refreshing encodings: {e}")
+            last_reload = now_ts_try
+
+        seq, frame = camera.read(with_seq=True)
+        if frame is None:
+            if not camera.running:
+                break        # /video_stop
+            continue         # no frame yet / reconnecting; the manager retries with backoff
+
+        # every viewer gets every frame, but a frame is paced / recognised once, by whichever viewer is first
+        with live_lock:
+            if seq != live_state["seq"]:
+                live_state["seq"] = seq
+                recognise, live_state["pause"] = pacer.decide() if pacer else (True, 0.0)
+                if recognise:
+                    live_state["results"], live_state["at"] = engine.process(frame), time.monotonic()
+                    if pacer:
+                        pacer.saw(live_state["results"])
+
+                    # debug prints so you can see terminal output
+                    if len(live_state["results"]) == 0:
+                        # only print sometimes to avoid flooding
+                        if int(datetime.now().timestamp()) % 5 == 0:
+                            print("ℹ️ No faces detected in this frame.")
+                    else:
+                        print(f"👀 Faces detected: {len(live_state['results'])}")
+                elif time.monotonic() - live_state["at"] > 1.0:
+                    live_state["results"] = []     # boxes of the last recognised frame stay up for a second
+            results, pause = live_state["results"], live_state["pause"]
+
+        draw_results(frame, results)
 
         # encode & yield
         ret, buffer = cv2.imencode(".jpg", frame)
@@ -575,6 +692,8 @@ def gen_frames():
             continue
         frame_bytes = buffer.tobytes()
         yield (b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n")
+        if pause:
+            time.sleep(pause)
 
 
 @app.route("/video_feed")
@@ -584,9 +703,7 @@ def video_feed():
 
 @app.route("/video_stop")
 def video_stop():
-    global camera
-    if camera and camera.isOpened():
-        camera.release()
+    camera.stop()
     flash("Camera stopped", "info")
     return redirect(url_for("student_dashboard"))
 
@@ -597,24 +714,15 @@ def view_attendance():
     if not require_login():
         return redirect(url_for("login"))
 
-    db = get_db(DATABASE_PATH)
-    cur = db.cursor()
-
     today = date.today().isoformat()
 
     # Present students for today
-    cur.execute("SELECT token_no, name, date, time, status FROM attendance WHERE date=? ORDER BY time ASC", (today,))
-    rows = cur.fetchall()
+    rows = storage.attendance_for_day(today)
 
     # Absent students: those in students table but not in today's attendance
-    cur.execute("""
-        SELECT token_no, name FROM students 
-        WHERE token_no NOT IN (SELECT token_no FROM attendance WHERE date=?)
-        ORDER BY name ASC
-    """, (today,))
-    absent_rows = cur.fetchall()
+    absent_rows = storage.absent_for_day(today)
 
-    return render_template("view_attendance.html", rows=rows, absent_rows=absent_rows, date=today)
+    return render_template("view_attendance.html", rows=rows, absent_rows=absent_rows, date=today, live=True)
 
 
 # ---------- Export ----------
@@ -626,34 +734,31 @@ def export_attendance():
     today = date.today().isoformat()
     selected_date = request.args.get("date") or today
     fmt = request.args.get("fmt") or "csv"
+    try:
+        # also keeps query text out of the ATT_DIR file names below
+        selected_date = datetime.strptime(selected_date, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
 
     csv_path = os.path.join(ATT_DIR, f"{selected_date}.csv")
     excel_path = os.path.join(ATT_DIR, f"{selected_date}.xlsx")
 
-    export_attendance_csv(DATABASE_PATH, csv_path)
-    export_attendance_excel(DATABASE_PATH, excel_path)
+    # days older than ARCHIVE_KEEP_DAYS are only in the Parquet archive
+    export_attendance_csv(storage, csv_path, day=selected_date, archive_dir=ARCHIVE_DIR)
+    export_attendance_excel(storage, excel_path, day=selected_date, archive_dir=ARCHIVE_DIR)
 
     if fmt == "excel":
         return send_file(excel_path, as_attachment=True)
     return send_file(csv_path, as_attachment=True)
 
 
-from flask import session
-
 @app.route("/forgot_password", methods=["GET", "POST"])
 def forgot_password():
     if request.method == "POST":
         username = request.form.get("username")
         token_no = request.form.get("token_no")
-        db = get_db(DATABASE_PATH)
-        cur = db.cursor()
         # Student info match in users and students table
-        cur.execute("""
-            SELECT users.username FROM users
-            JOIN students ON users.username = ? AND students.token_no = ? AND students.name = users.username
-        """, (username, token_no))
-        user = cur.fetchone()
-        if user:
+        if storage.user_is_student(username, token_no):
             session['reset_user'] = username
             return redirect(url_for('reset_password'))
         else:
@@ -661,8 +766,6 @@ def forgot_password():
             return redirect(url_for('forgot_password'))
     return render_template("forgot_password.html")
 
-from werkzeug.security import check_password_hash, generate_password_hash
-
 @app.route("/reset_password", methods=["GET", "POST"])
 def reset_password():
     username = session.get('reset_user')
@@ -670,16 +773,13 @@ def reset_password():
         flash("Unauthorized access.", "danger")
         return redirect(url_for('login'))
 
-    db = get_db(DATABASE_PATH)
-    cur = db.cursor()
     # Fetch user's password hash
-    cur.execute("SELECT password_hash FROM users WHERE username = ?", (username,))
-    row = cur.fetchone()
+    row = storage.get_user(username)
     if not row:
         flash("User not found.", "danger")
         session.pop('reset_user', None)
         return redirect(url_for("forgot_password"))
-    saved_hash = row[0]
+    saved_hash = row[2]
 
     if request.method == "POST":
         old_password = request.form.get("old_password")
@@ -689,9 +789,7 @@ def reset_password():
             flash("Old password is incorrect!", "danger")
             return render_template("reset_password.html")
         # Update to new password
-        cur.execute("UPDATE users SET password_hash = ? WHERE username = ?",
-                    (generate_password_hash(new_password), username))
-        db.commit()
+        storage.set_password(username, generate_password_hash(new_password))
         session.pop('reset_user', None)
         flash("Password reset successful! Please login.", "success")
         return redirect(url_for("login"))
@@ -716,23 +814,16 @@ def register_user():
             flash("Please fill all fields.", "danger")
             return redirect(url_for("register_user"))
 
-        db = get_db(DATABASE_PATH)
-        cur = db.cursor()
-        cur.execute("SELECT id FROM users WHERE username=?", (username,))
-        if cur.fetchone():
+        pwd_hash = generate_password_hash(password)
+        if not storage.add_user(username, pwd_hash, role):
             flash("Username already exists!", "danger")
             return redirect(url_for("register_user"))
-
-        pwd_hash = generate_password_hash(password)
-        cur.execute(
-            "INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
-            (username, pwd_hash, role)
-        )
-        db.commit()
         flash("User registered successfully!", "success")
         return redirect(url_for("login"))
     return render_template("register_user.html")
 
+print_startup_report()
+
 # ---------- Run ----------
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,93 @@
+"""
+Speed and recall of the face detector backends (modules/detectors.py).
+
+    python benchmarks/detector_benchmark.py                          # known_faces/*.jpg of this install
+    python benchmarks/detector_benchmark.py --images frames/ --backends hog haar "cascade:haar>hog" yunet
+
+Each image is resized by --scale, like the live feed does, and given to every
+backend. The reference boxes come from --reference (HOG with 2x upsampling on
+the full-size image by default), so "recall" is the share of reference faces a
+backend finds (IoU >= 0.3) and "extra" counts boxes that match no reference
+face. Backends whose model files are missing are reported and skipped.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from modules.detectors import make_detector
+
+
+def iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area = lambda x: (x[2] - x[0]) * (x[1] - x[3])
+    return inter / float(area(a) + area(b) - inter) if inter else 0.0
+
+
+def load_images(folder, limit):
+    import cv2
+
+    files = sorted(f for f in os.listdir(folder) if f.lower().endswith((".jpg", ".jpeg", ".png")))[:limit]
+    images = []
+    for f in files:
+        bgr = cv2.imread(os.path.join(folder, f))
+        if bgr is not None:
+            images.append(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+    return images
+
+
+def main():
+    import cv2
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default=os.path.join(os.path.dirname(__file__), "..", "known_faces"))
+    parser.add_argument("--backends", nargs="+", default=["hog", "haar", "cascade:haar>hog", "yunet", "ssd"])
+    parser.add_argument("--reference", default="hog:2")
+    parser.add_argument("--scale", type=float, default=0.5)
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    if not images:
+        print(f"⚠️ No images in {args.images}.")
+        return
+
+    reference = make_detector(args.reference)
+    truth = [[tuple(int(v * args.scale) for v in box) for box in reference.detect(img)] for img in images]
+    small = [cv2.resize(img, (0, 0), fx=args.scale, fy=args.scale) for img in images]
+    n_faces = sum(len(t) for t in truth)
+    print(f"📊 {len(images)} images, {n_faces} reference faces ({args.reference}), scale {args.scale}")
+    print(f"{'backend':<22}{'p50 ms':>9}{'p95 ms':>9}{'recall':>9}{'extra':>7}")
+
+    for spec in args.backends:
+        try:
+            det = make_detector(spec)
+        except Exception as e:
+            print(f"{spec:<22}  skipped: {e}")
+            continue
+        det.detect(small[0])   # model load / first-call cost is not per-frame cost
+        times, found, extra = [], 0, 0
+        for img, ref in zip(small, truth):
+            start = time.perf_counter()
+            boxes = det.detect(img)
+            times.append((time.perf_counter() - start) * 1000.0)
+            matched = set()
+            for box in boxes:
+                hits = [i for i, r in enumerate(ref) if i not in matched and iou(box, r) >= 0.3]
+                if hits:
+                    matched.add(hits[0])
+                else:
+                    extra += 1
+            found += len(matched)
+        recall = found / n_faces if n_faces else float("nan")
+        print(f"{spec:<22}{np.percentile(times, 50):>9.1f}{np.percentile(times, 95):>9.1f}"
+              f"{recall:>9.3f}{extra:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+HTTP load test of the web app: dashboards, attendance pages, exports, the
+student roster, analytics and the live video stream.
+
+    python benchmarks/load_test.py                                  # 20 users for 30 s on a seeded copy
+    python benchmarks/load_test.py --users 50 --duration 120 --students 3000 --days 180
+    python benchmarks/load_test.py --url http://127.0.0.1:8000      # a server you started (e.g. gunicorn)
+    python benchmarks/load_test.py --json load.json                 # also write the results
+
+Without --url the app is copied to a scratch directory, given a synthetic
+database (students, --days of attendance, random 128-d encodings) and a fake
+camera (a folder of generated frames, PVP_CAMERA_SOURCE), and started with
+Flask's threaded server on a free port. The real database is never touched.
+
+Each user logs in as admin and requests routes at random by weight, back to
+back (closed loop). --video-clients viewers hold /video_feed open meanwhile.
+Per route: requests, errors (HTTP >= 400, timeouts, bounces to the login
+page), throughput and p50 / p95 / p99 latency of the complete response.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import pickle
+import sqlite3
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.cookiejar
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+import numpy as np
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO)
+
+from modules.utils import init_db
+
+# (name, path, weight); {day} = a random seeded day, {today}, {month_ago}
+ROUTES = [
+    ("dashboard_admin", "/dashboard/admin", 5),
+    ("dashboard_teacher", "/dashboard/teacher", 3),
+    ("dashboard_student", "/dashboard/student", 3),
+    ("attendance_view", "/attendance/view", 4),
+    ("students", "/students", 3),
+    ("api_students", "/api/students?limit=50", 2),
+    ("export_csv", "/attendance/export?date={day}", 1),
+    ("export_excel", "/attendance/export?date={day}&fmt=excel", 1),
+    ("analytics", "/api/analytics/attendance?from={month_ago}&to={today}", 1),
+    ("readyz", "/readyz", 1),
+    ("static_logo", "/static/logo.png", 2),
+]
+ADMIN = ("admin", "admin123")   # created by ensure_default_users()
+
+
+# ---------- Seeding ----------
+def seed(workdir, students, days, present=0.85, frames=30):
+    """Synthetic database, encodings and fake camera frames under workdir."""
+    rng = np.random.default_rng(0)
+    db_path = os.path.join(workdir, "database", "attendance.db")
+    enc_dir = os.path.join(workdir, "encodings")
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    os.makedirs(enc_dir, exist_ok=True)
+    init_db(db_path)
+
+    roster = [(f"S{i:05d}", f"Student {i:05d}") for i in range(students)]
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT OR IGNORE INTO students(token_no, name, photo_path, encoding_path) VALUES (?, ?, ?, ?)",
+                     [(t, n, "", os.path.join(enc_dir, f"{t}.pkl")) for t, n in roster])
+    today = date.today()
+    rows = []
+    for back in range(days):
+        day = (today - timedelta(days=back)).isoformat()
+        for token_no, name in roster:
+            if rng.random() < present:
+                minutes = int(rng.normal(9 * 60 + 5, 12))
+                t = f"{minutes // 60:02d}:{minutes % 60:02d}:{int(rng.integers(60)):02d}"
+                rows.append((token_no, name, day, t, "Late" if t > "09:15:00" else "On Time"))
+    conn.executemany("INSERT INTO attendance(token_no, name, date, time, status) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+    for (token_no, name), enc in zip(roster, rng.normal(0, 0.09, (students, 128))):
+        with open(os.path.join(enc_dir, f"{token_no}.pkl"), "wb") as f:
+            pickle.dump({"token_no": token_no, "name": name, "encoding": enc}, f)
+
+    camera_dir = os.path.join(workdir, "fake_camera")
+    os.makedirs(camera_dir, exist_ok=True)
+    try:
+        import cv2
+
+        for i in range(frames):
+            img = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+            cv2.imwrite(os.path.join(camera_dir, f"frame_{i:03d}.jpg"), img)
+    except ImportError:
+        camera_dir = None
+    return {"students": students, "attendance_rows": len(rows), "days": days, "camera": camera_dir}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, camera_dir, port, timeout=180.0):
+    """Copy of the app under workdir, on Flask's threaded server. Returns (process, base URL)."""
+    for name in ("app.py", "attendance_policy.json"):
+        if os.path.exists(os.path.join(REPO, name)):
+            shutil.copy(os.path.join(REPO, name), workdir)
+    for name in ("modules", "templates", "static"):
+        shutil.copytree(os.path.join(REPO, name), os.path.join(workdir, name),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+    env = dict(os.environ, PVP_CAMERA_SOURCE=camera_dir or "")
+    env.pop("PVP_STORAGE_URL", None)
+    code = f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True, use_reloader=False)"
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited; see {log.name}")
+        try:
+            with urllib.request.urlopen(url + "/readyz", timeout=2) as r:
+                if r.status == 200:
+                    return proc, url
+        except Exception:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"Server not ready after {timeout:.0f}s; see {log.name}")
+
+
+# ---------- Load ----------
+class Recorder:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, route, ms, ok):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(ms)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def login(url):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    data = urllib.parse.urlencode({"username": ADMIN[0], "password": ADMIN[1]}).encode()
+    with opener.open(url + "/login", data, timeout=30) as r:
+        r.read()
+    if not any(c.name == "user" for c in jar):
+        raise RuntimeError("Login failed (is the admin/admin123 default user present?)")
+    return opener
+
+
+def user_loop(url, days, stop_at, recorder, timeout, seed_):
+    rnd = random.Random(seed_)
+    try:
+        opener = login(url)
+    except Exception:
+        recorder.add("login", 0.0, False)
+        return
+    names = [r[0] for r in ROUTES]
+    weights = [r[2] for r in ROUTES]
+    paths = dict((r[0], r[1]) for r in ROUTES)
+    fill = {"today": date.today().isoformat(), "month_ago": (date.today() - timedelta(days=30)).isoformat()}
+    while time.monotonic() < stop_at:
+        route = rnd.choices(names, weights)[0]
+        path = paths[route].format(day=rnd.choice(days), **fill)
+        start = time.perf_counter()
+        ok = True
+        try:
+            with opener.open(url + path, timeout=timeout) as r:
+                r.read()
+                ok = "/login" not in r.geturl()     # require_login() bounced us
+        except Exception:
+            ok = False
+        recorder.add(route, (time.perf_counter() - start) * 1000.0, ok)
+
+
+def video_client(url, stop_at, results):
+    """Reads /video_feed until stop_at; records time to first frame and gaps between frames."""
+    start = time.perf_counter()
+    gaps, first, last, frames = [], None, None, 0
+    try:
+        opener = login(url)
+        with opener.open(url + "/video_feed", timeout=30) as r:
+            while time.monotonic() < stop_at:
+                line = r.readline()
+                if not line:
+                    break
+                if line.startswith(b"--frame"):
+                    now = time.perf_counter()
+                    if first is None:
+                        first = (now - start) * 1000.0
+                    elif last is not None:
+                        gaps.append((now - last) * 1000.0)
+                    last, frames = now, frames + 1
+    except Exception as e:
+        results.append({"error": str(e)})
+        return
+    results.append({"frames": frames, "first_frame_ms": first, "gaps": gaps, "seconds": time.perf_counter() - start})
+
+
+def run(url, users, duration, days, video_clients, timeout):
+    recorder = Recorder()
+    stop_at = time.monotonic() + duration
+    video = []
+    threads = [threading.Thread(target=user_loop, args=(url, days, stop_at, recorder, timeout, i), daemon=True)
+               for i in range(users)]
+    threads += [threading.Thread(target=video_client, args=(url, stop_at, video), daemon=True)
+                for _ in range(video_clients)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(duration + timeout + 5)
+    elapsed = time.monotonic() - start
+    if video_clients:
+        try:
+            login(url).open(url + "/video_stop", timeout=10).read()
+        except Exception:
+            pass
+    return recorder, video, elapsed
+
+
+# ---------- Report ----------
+def summarise(recorder, video, elapsed):
+    routes = {}
+    total = []
+    for route, values in sorted(recorder.latencies.items()):
+        v = np.array(values)
+        total += values
+        routes[route] = {
+            "requests": len(v),
+            "errors": recorder.errors.get(route, 0),
+            "rps": round(len(v) / elapsed, 2),
+            "p50_ms": round(float(np.percentile(v, 50)), 1),
+            "p95_ms": round(float(np.percentile(v, 95)), 1),
+            "p99_ms": round(float(np.percentile(v, 99)), 1),
+        }
+    errors = sum(recorder.errors.values())
+    out = {"seconds": round(elapsed, 1), "requests": len(total), "errors": errors,
+           "rps": round(len(total) / elapsed, 2) if elapsed else 0.0,
+           "error_rate": round(errors / len(total), 4) if total else 0.0, "routes": routes, "video": []}
+    for v in video:
+        if "error" in v:
+            out["video"].append(v)
+            continue
+        gaps = np.array(v["gaps"] or [0.0])
+        out["video"].append({"frames": v["frames"], "fps": round(v["frames"] / v["seconds"], 2),
+                             "first_frame_ms": round(v["first_frame_ms"] or 0.0, 1),
+                             "gap_p50_ms": round(float(np.percentile(gaps, 50)), 1),
+                             "gap_p95_ms": round(float(np.percentile(gaps, 95)), 1)})
+    return out
+
+
+def print_report(report):
+    print(f"{'route':<20}{'reqs':>7}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, r in report["routes"].items():
+        print(f"{route:<20}{r['requests']:>7}{r['errors']:>8}{r['rps']:>8.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+    print(f"{'total':<20}{report['requests']:>7}{report['errors']:>8}{report['rps']:>8.1f}"
+          f"   error rate {report['error_rate']:.2%} over {report['seconds']} s")
+    for i, v in enumerate(report["video"]):
+        if "error" in v:
+            print(f"🎥 viewer {i}: failed: {v['error']}")
+        else:
+            print(f"🎥 viewer {i}: {v['frames']} frames, {v['fps']} fps, first frame {v['first_frame_ms']} ms, "
+                  f"gap p50 {v['gap_p50_ms']} ms / p95 {v['gap_p95_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="test a running server instead of a seeded copy")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--video-clients", type=int, default=1)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=90, help="days of seeded attendance")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout, seconds")
+    parser.add_argument("--workdir", help="scratch directory for the seeded copy (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the scratch directory (its server.log has the tracebacks of failed requests)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    days = [(date.today() - timedelta(days=i)).isoformat() for i in range(max(1, args.days))]
+    proc, workdir = None, None
+    if args.url:
+        url = args.url.rstrip("/")
+    else:
+        workdir = args.workdir or tempfile.mkdtemp(prefix="pvp-load-")
+        start = time.perf_counter()
+        seeded = seed(workdir, args.students, args.days)
+        print(f"🌱 Seeded {seeded['students']} students, {seeded['attendance_rows']} attendance rows "
+              f"in {time.perf_counter() - start:.1f}s ({workdir})")
+        proc, url = start_server(workdir, seeded["camera"], _free_port())
+        print(f"🚀 Server up at {url}")
+
+    try:
+        print(f"📊 {args.users} users + {args.video_clients} video viewers for {args.duration:.0f}s against {url}")
+        report = summarise(*run(url, args.users, args.duration, days, args.video_clients, args.timeout))
+        report.update(users=args.users, url=url)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(10)
+        if workdir and not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Accuracy / memory of the quantised gallery vs full precision.
+
+    python benchmarks/quantization_report.py                 # encodings/*.pkl of this install
+    python benchmarks/quantization_report.py --synthetic 20000
+
+With the real gallery, each encoding plus a little noise is used as a probe,
+so "top1_agreement" is how often quantised search (+ exact re-rank) picks
+the same student as float64 search.
+"""
+import os
+import sys
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from modules.utils import load_all_encodings
+from modules.quantize import accuracy_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--enc-dir", default=os.path.join(os.path.dirname(__file__), "..", "encodings"))
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random 128-d encodings instead")
+    parser.add_argument("--noise", type=float, default=0.03, help="probe noise (std-dev per dimension)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        encodings = np.random.default_rng(0).normal(0, 0.09, (args.synthetic, 128))
+        source = f"{args.synthetic} synthetic encodings"
+    else:
+        encodings, _, _ = load_all_encodings(args.enc_dir)
+        source = f"{len(encodings)} encodings from {args.enc_dir}"
+    if len(encodings) == 0:
+        print("⚠️ No encodings to test. Register students or pass --synthetic N.")
+        return
+
+    print(f"📊 Quantisation report for {source} (probe noise {args.noise})")
+    report = accuracy_report(encodings, noise=args.noise)
+    print(f"{'mode':<8} {'top1 (+rerank)':>15} {'top1 (approx)':>14} {'max |Δd|':>10} {'MB':>8} {'MB f64':>8}")
+    for mode, r in report.items():
+        print(f"{mode:<8} {r['top1_agreement']:>15.4f} {r['approx_top1_agreement']:>14.4f} "
+              f"{r['max_abs_dist_error']:>10.2e} {r['bytes'] / 1e6:>8.2f} {r['bytes_float64'] / 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import os
+import time
+import datetime
+import threading
+
+# Columnar archive of closed attendance days.
+#
+#   <archive>/attendance/year=2026/month=03/day-2026-03-04-<ns>.parquet   one file per archived batch
+#   <archive>/attendance/year=2026/month=03/month-2026-03.parquet         closed month, compacted
+#
+# The nightly job moves every day older than keep_days out of the hot
+# attendance table into Parquet (written, verified, then deleted from the
+# table), compacts finished months into one file, and drops year partitions
+# past the retention period. Reports list the month directories a date range
+# touches and read only those files and the columns they need; the few days
+# still in the hot table are added from the database.
+#
+# pyarrow is optional: without it the app runs as before and the archive
+# endpoints answer 501.
+
+COLUMNS = ["token_no", "name", "date", "time", "status"]
+KEEP_DAYS = 30
+LOCK_STALE_AFTER = 6 * 3600   # seconds; backstop for a lock whose pid has been reused
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Attendance archive needs pyarrow (pip install pyarrow)")
+
+
+def _month_dir(archive_dir, year, month):
+    return os.path.join(archive_dir, "attendance", f"year={year:04d}", f"month={month:02d}")
+
+
+def _partition(name, key, width):
+    """2026 for ("year=2026", "year", 4); None for anything else in the tree (.DS_Store, tmp dirs...)."""
+    value = name[len(key) + 1:]
+    if name.startswith(key + "=") and value.isdigit() and len(value) == width:
+        return int(value)
+    return None
+
+
+def _write(table, path):
+    import pyarrow.parquet as pq
+
+    tmp = path + ".tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    if pq.read_metadata(tmp).num_rows != table.num_rows:
+        os.remove(tmp)
+        raise IOError(f"Archive write of {path} did not verify")
+    os.replace(tmp, path)
+
+
+def _table(rows):
+    import pyarrow as pa
+
+    cols = list(zip(*rows)) if rows else [[] for _ in COLUMNS]
+    return pa.table({name: pa.array([None if v is None else str(v) for v in col], type=pa.string())
+                     for name, col in zip(COLUMNS, cols)})
+
+
+def archive_day(storage, archive_dir, day):
+    """Move one day from the hot table into the archive. Returns rows moved."""
+    rows = storage.attendance_between(day, day)
+    if not rows:
+        return 0
+    d = datetime.date.fromisoformat(day)
+    folder = _month_dir(archive_dir, d.year, d.month)
+    os.makedirs(folder, exist_ok=True)
+    _write(_table(rows), os.path.join(folder, f"day-{day}-{time.time_ns()}.parquet"))
+    storage.delete_attendance_day(day)
+    return len(rows)
+
+
+def compact_month(archive_dir, year, month):
+    """Merge a closed month's day files (and any earlier compaction) into one sorted, de-duplicated file."""
+    import pyarrow.parquet as pq
+    import pyarrow as pa
+
+    folder = _month_dir(archive_dir, year, month)
+    days = [f for f in os.listdir(folder) if f.startswith("day-") and f.endswith(".parquet")]
+    if not days:
+        return False
+    target = os.path.join(folder, f"month-{year:04d}-{month:02d}.parquet")
+    parts = [pq.read_table(os.path.join(folder, f)) for f in sorted(days)]
+    if os.path.exists(target):
+        parts.insert(0, pq.read_table(target))
+    schema = _table([]).schema
+    # pandas may round-trip strings as large_string; keep every file on one schema
+    df = pa.concat_tables([t.select(COLUMNS).cast(schema) for t in parts]).to_pandas()
+    df = df.sort_values(["date", "time"]).drop_duplicates(["token_no", "date"], keep="first")
+    _write(pa.Table.from_pandas(df[COLUMNS], schema=schema, preserve_index=False), target)
+    for f in days:
+        os.remove(os.path.join(folder, f))
+    return True
+
+
+def prune(archive_dir, retain_years, today=None):
+    """Delete year partitions older than retain_years. Returns the years removed."""
+    import shutil
+
+    today = today or datetime.date.today()
+    root = os.path.join(archive_dir, "attendance")
+    removed = []
+    if not retain_years or not os.path.isdir(root):
+        return removed
+    for name in os.listdir(root):
+        year = _partition(name, "year", 4)
+        if year is not None and year < today.year - retain_years:
+            shutil.rmtree(os.path.join(root, name))
+            removed.append(year)
+    return removed
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass
+    return True
+
+
+def _acquire(archive_dir):
+    """
+    O_EXCL archive.lock (same pattern as the event log's replay.lock): every
+    worker schedules the nightly job, only one may run it. A lock left by a
+    process that no longer exists is taken over.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    lock = os.path.join(archive_dir, "archive.lock")
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            with open(lock) as f:
+                pid = int(f.read().strip() or 0)
+            if not _pid_alive(pid) or time.time() - os.path.getmtime(lock) > LOCK_STALE_AFTER:
+                os.remove(lock)
+                return _acquire(archive_dir)
+        except FileNotFoundError:
+            return _acquire(archive_dir)
+        except ValueError:
+            pass     # being written right now
+        return False
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    return True
+
+
+def _release(archive_dir):
+    try:
+        os.remove(os.path.join(archive_dir, "archive.lock"))
+    except FileNotFoundError:
+        pass
+
+
+def run_archival(storage, archive_dir, keep_days=KEEP_DAYS, retain_years=None, csv_dir=None,
+                 event_log=None, today=None):
+    """The nightly job. Returns a summary dict (also printed), or None if another process is running it."""
+    _require_pyarrow()
+    if not _acquire(archive_dir):
+        print("🗄️ Attendance archival already running in another process; skipped.")
+        return None
+    try:
+        return _run_archival(storage, archive_dir, keep_days, retain_years, csv_dir, event_log, today)
+    finally:
+        _release(archive_dir)
+
+
+def _run_archival(storage, archive_dir, keep_days, retain_years, csv_dir, event_log, today):
+    today = today or datetime.date.today()
+    cutoff = (today - datetime.timedelta(days=keep_days)).isoformat()
+    start = time.perf_counter()
+
+    moved, days = 0, storage.attendance_days_before(cutoff)
+    for day in days:
+        moved += archive_day(storage, archive_dir, day)
+        if csv_dir:
+            path = os.path.join(csv_dir, f"attendance_{day}.csv")
+            if os.path.exists(path):
+                os.remove(path)       # duplicate of the archived rows (replayed from the event log)
+
+    compacted = 0
+    root = os.path.join(archive_dir, "attendance")
+    if os.path.isdir(root):
+        for ydir in os.listdir(root):
+            year = _partition(ydir, "year", 4)
+            if year is None or not os.path.isdir(os.path.join(root, ydir)):
+                continue
+            for mdir in os.listdir(os.path.join(root, ydir)):
+                month = _partition(mdir, "month", 2)
+                if month is None or not os.path.isdir(os.path.join(root, ydir, mdir)):
+                    continue
+                if (year, month) < (today.year, today.month) and compact_month(archive_dir, year, month):
+                    compacted += 1
+
+    summary = {
+        "days_archived": len(days),
+        "rows_archived": moved,
+        "months_compacted": compacted,
+        "years_pruned": prune(archive_dir, retain_years, today),
+        "event_segments_pruned": event_log.prune(cutoff) if event_log is not None else 0,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    print(f"🗄️ Attendance archival: {summary}")
+    return summary
+
+
+# ---------- Queries ----------
+def _files_for(archive_dir, start, end):
+    """Parquet files of the month partitions overlapping [start, end] (partition pruning)."""
+    s, e = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+    files = []
+    year, month = s.year, s.month
+    while (year, month) <= (e.year, e.month):
+        folder = _month_dir(archive_dir, year, month)
+        if os.path.isdir(folder):
+            files += [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.endswith(".parquet")]
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return files
+
+
+def read_archive(archive_dir, start, end, token_no=None, columns=None):
+    """Archived rows in [start, end] as a DataFrame, reading only the needed files and columns."""
+    import pyarrow.dataset as ds
+
+    _require_pyarrow()
+    columns = columns or COLUMNS
+    files = _files_for(archive_dir, start, end)
+    if not files:
+        import pandas as pd
+
+        return pd.DataFrame(columns=columns)
+    flt = (ds.field("date") >= start) & (ds.field("date") <= end)
+    if token_no:
+        flt = flt & (ds.field("token_no") == token_no)
+    return ds.dataset(files, format="parquet").to_table(columns=columns, filter=flt).to_pandas()
+
+
+def attendance_report(storage, archive_dir, start, end, token_no=None):
+    """
+    Present / late counts per day and per student over any date range,
+    archived and hot rows combined.
+    """
+    import pandas as pd
+
+    df = read_archive(archive_dir, start, end, token_no)
+    hot = pd.DataFrame(storage.attendance_between(start, end, token_no), columns=COLUMNS)
+    df = pd.concat([df, hot], ignore_index=True).drop_duplicates(["token_no", "date"], keep="first")
+    df["late"] = df["status"] == "Late"
+    per_day = df.groupby("date").agg(present=("token_no", "size"), late=("late", "sum")).reset_index()
+    per_student = (df.groupby(["token_no", "name"]).agg(days_present=("date", "nunique"), late=("late", "sum"))
+                   .reset_index().sort_values("token_no"))
+    return {
+        "from": start,
+        "to": end,
+        "rows": int(len(df)),
+        "per_day": [{"date": r.date, "present": int(r.present), "late": int(r.late)}
+                    for r in per_day.itertuples()],
+        "per_student": [{"token_no": r.token_no, "name": r.name, "days_present": int(r.days_present),
+                         "late": int(r.late)} for r in per_student.itertuples()],
+    }
+
+
+# ---------- Schedule ----------
+def schedule_daily(job, hour=2, name="archiver"):
+    """Run job() every day at `hour`:00 local time in a daemon thread."""
+    def loop():
+        while True:
+            now = datetime.datetime.now()
+            nxt = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+            if nxt <= now:
+                nxt += datetime.timedelta(days=1)
+            time.sleep((nxt - now).total_seconds())
+            try:
+                job()
+            except Exception as e:
+                print(f"⚠️ Scheduled {name} failed: {e}")
+
+    t = threading.Thread(target=loop, name=name, daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,119 @@
+import os
+import json
+import datetime
+
+DEFAULT_CUTOFF = "09:15:00"
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+class LatePolicy:
+    """
+    On Time / Late cutoffs, resolved per (day, class) with this precedence:
+    by_date[day] > by_class[class][weekday] > by_class[class]["default"] > by_weekday[weekday] > default.
+    Cutoffs are "HH:MM:SS" strings; marks are zero-padded the same way, so a
+    plain string comparison is a time comparison and no strptime is needed.
+    Resolved cutoffs are memoised, so a whole export resolves each (day, class) once.
+    """
+
+    def __init__(self, default=DEFAULT_CUTOFF, by_weekday=None, by_class=None, by_date=None):
+        self.default = default
+        self.by_weekday = by_weekday or {}
+        self.by_class = by_class or {}
+        self.by_date = by_date or {}
+        self._cache = {}
+
+    @classmethod
+    def from_dict(cls, cfg):
+        return cls(
+            default=cfg.get("default", DEFAULT_CUTOFF),
+            by_weekday=cfg.get("by_weekday"),
+            by_class=cfg.get("by_class"),
+            by_date=cfg.get("by_date"),
+        )
+
+    def cutoff(self, day, class_name=None):
+        """Cutoff for an ISO date string (YYYY-MM-DD) and optional class."""
+        key = (day, class_name)
+        cut = self._cache.get(key)
+        if cut is None:
+            cut = self._resolve(day, class_name)
+            self._cache[key] = cut
+        return cut
+
+    def _resolve(self, day, class_name):
+        if day in self.by_date:
+            return self.by_date[day]
+        try:
+            weekday = WEEKDAYS[datetime.date.fromisoformat(day).weekday()]
+        except (TypeError, ValueError):
+            weekday = None
+        per_class = self.by_class.get(class_name) if class_name else None
+        if per_class:
+            if weekday in per_class:
+                return per_class[weekday]
+            if "default" in per_class:
+                return per_class["default"]
+        return self.by_weekday.get(weekday, self.default)
+
+    def class_of(self, token_no, members, current=None):
+        """
+        Class whose cutoffs apply to token_no: `current` (the session shard a
+        camera is in) if they belong to it, else the first by_class entry they
+        are a member of. members(shard) -> tokens (Gallery.members, or the
+        storage shard_memberships dict's .get). Classes are gallery shards.
+        """
+        if not self.by_class or members is None:
+            return None
+        if current in self.by_class and token_no in members(current):
+            return current
+        for class_name in sorted(self.by_class):
+            if token_no in members(class_name):
+                return class_name
+        return None
+
+    def status(self, time_str, day, class_name=None):
+        """'On Time' / 'Late' for one mark."""
+        return "Late" if time_str > self.cutoff(day, class_name) else "On Time"
+
+    def status_series(self, times, days, classes=None):
+        """
+        Vectorised status for whole result sets (pandas Series in, Series out).
+        Badly formatted times give "Unknown", like get_status always did.
+        """
+        import numpy as np
+        import pandas as pd
+
+        times = pd.Series(times).astype(str)
+        days = pd.Series(days, index=times.index).astype(str)
+        if classes is None:
+            keys = days
+            cut = keys.map({d: self.cutoff(d) for d in keys.unique()})
+        else:
+            classes = pd.Series(classes, index=times.index)
+            pairs = list(zip(days, classes))
+            lookup = {p: self.cutoff(*p) for p in set(pairs)}
+            cut = pd.Series([lookup[p] for p in pairs], index=times.index)
+        valid = times.str.fullmatch(r"\d{2}:\d{2}:\d{2}")
+        status = np.where(times.values > cut.values.astype(str), "Late", "On Time")
+        return pd.Series(np.where(valid.values, status, "Unknown"), index=times.index)
+
+
+_policy = LatePolicy()
+
+
+def get_policy():
+    """The process-wide policy shared by live marking and exports."""
+    return _policy
+
+
+def set_policy(policy):
+    global _policy
+    _policy = policy
+
+
+def load_policy(path):
+    """Read a JSON policy file; missing file -> default 09:15:00 policy."""
+    if not os.path.exists(path):
+        return LatePolicy()
+    with open(path) as f:
+        return LatePolicy.from_dict(json.load(f))
@@ -0,0 +1,298 @@
+import os
+import time
+import threading
+from collections import deque
+
+# Camera capture for the live feed.
+#
+# OpenCV queues several frames inside the driver, so a loop that reads,
+# recognises (100+ ms) and reads again is always looking at the past. Here a
+# reader thread grab()s continuously and only retrieve()s (decodes) when the
+# consumer is waiting, so read() always gets the newest frame; frames grabbed
+# in between are never decoded. Any number of consumers (several /video_feed
+# viewers) can read at once: each decoded frame gets a sequence number and
+# every consumer thread keeps its own cursor, so each one gets every frame
+# newer than the last it saw and one leaving never stalls the others. The device is opened with MJPEG at the
+# requested resolution/FPS and a 1-frame buffer where the driver allows it,
+# and is reopened with exponential backoff when it stops delivering.
+
+CAPTURE = {
+    "width": 1280,
+    "height": 720,
+    "fps": 30,
+    "fourcc": "MJPG",
+    "indices": (0, 1, 2, 3),
+    "fail_after": 5,        # consecutive failed grabs before the device is reopened
+    "backoff_min": 0.5,
+    "backoff_max": 10.0,
+}
+
+
+def parse_source(value):
+    """PVP_CAMERA_SOURCE: "" -> probe CAPTURE["indices"], "2" -> index 2, anything else -> file/URL."""
+    if not value:
+        return None
+    return int(value) if value.isdigit() else value
+
+
+class FileDevice:
+    """
+    Fake camera backed by a video file or a folder of images, looped and paced
+    at `fps` like a real device, so the capture path can run without hardware.
+    """
+
+    def __init__(self, path, fps=30, loop=True):
+        import cv2
+
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self._next = time.monotonic()
+        self._frame = None
+        self._files = None
+        self._cap = None
+        self._pos = 0
+        if os.path.isdir(path):
+            self._files = sorted(os.path.join(path, f) for f in os.listdir(path)
+                                 if f.lower().endswith((".jpg", ".jpeg", ".png", ".bmp")))
+        else:
+            self._cap = cv2.VideoCapture(path)
+
+    def isOpened(self):
+        if self._files is not None:
+            return len(self._files) > 0
+        return self._cap is not None and self._cap.isOpened()
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        import cv2
+
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def _read_next(self):
+        import cv2
+
+        if self._files is not None:
+            if self._pos >= len(self._files):
+                if not self.loop:
+                    return None
+                self._pos = 0
+            frame = cv2.imread(self._files[self._pos])
+            self._pos += 1
+            return frame
+        ok, frame = self._cap.read()
+        if not ok and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self._cap.read()
+        return frame if ok else None
+
+    def grab(self):
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next = max(self._next, time.monotonic() - 1.0) + 1.0 / self.fps
+        self._frame = self._read_next()
+        return self._frame is not None
+
+    def retrieve(self):
+        return (self._frame is not None), self._frame
+
+    def read(self):
+        return (self.grab() and self.retrieve()) or (False, None)
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+
+
+def _open_index(index):
+    import cv2
+
+    if os.name == "nt":
+        try:
+            return cv2.VideoCapture(index, cv2.CAP_DSHOW)
+        except Exception:
+            pass
+    return cv2.VideoCapture(index)
+
+
+def _fourcc_str(value):
+    v = int(value)
+    return "".join(chr((v >> (8 * i)) & 0xFF) for i in range(4)) if v else ""
+
+
+class CameraManager:
+    """One capture device with a latest-frame reader thread. read() never returns a stale frame."""
+
+    def __init__(self, source=None, width=None, height=None, fps=None, fourcc=None):
+        self.source = source
+        self.width = width or CAPTURE["width"]
+        self.height = height or CAPTURE["height"]
+        self.fps = fps or CAPTURE["fps"]
+        self.fourcc = fourcc or CAPTURE["fourcc"]
+        self.device = None
+        self.negotiated = {}
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_ts = 0.0
+        self._seq = 0
+        self._waiting = 0      # readers blocked in read(); the reader thread decodes while > 0
+        self._cursor = threading.local()
+        self._thread = None
+        self._stop = threading.Event()
+        self.reconnects = 0
+        self.grabbed = 0
+        self.age_ms = deque(maxlen=300)
+        self.connected = False
+
+    # ---------- Device ----------
+    def _configure(self, cap):
+        import cv2
+
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_FPS, self.fps)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)   # ignored by some backends; the reader thread covers those
+        # drivers silently fall back to what they support; report what we actually got
+        self.negotiated = {
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": cap.get(cv2.CAP_PROP_FPS),
+            "fourcc": _fourcc_str(cap.get(cv2.CAP_PROP_FOURCC)),
+            "buffersize": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+        }
+
+    def _open(self):
+        if isinstance(self.source, str):
+            cap = FileDevice(self.source, fps=self.fps)
+            if cap.isOpened():
+                self.negotiated = {"file": self.source, "fps": self.fps}
+                print(f"✅ Camera opened from {self.source}")
+                return cap
+            cap.release()
+            return None
+        indices = [self.source] if self.source is not None else CAPTURE["indices"]
+        for i in indices:
+            cap = _open_index(i)
+            if cap is not None and cap.isOpened():
+                self._configure(cap)
+                print(f"✅ Camera opened at index {i}: {self.negotiated}")
+                return cap
+            try:
+                cap.release()
+            except Exception:
+                pass
+        return None
+
+    def _close(self):
+        if self.device is not None:
+            try:
+                self.device.release()
+            except Exception:
+                pass
+        self.device = None
+        self.connected = False
+
+    # ---------- Reader thread ----------
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._reader, name="camera-reader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the reader and release the device."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and not self._stop.is_set()
+
+    def _reader(self):
+        backoff = CAPTURE["backoff_min"]
+        failures = 0
+        while not self._stop.is_set():
+            if self.device is None:
+                self.device = self._open()
+                if self.device is None:
+                    print(f"❌ No camera available; retrying in {backoff:.1f}s")
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, CAPTURE["backoff_max"])
+                    continue
+                self.connected = True
+                failures = 0
+            if not self.device.grab():
+                failures += 1
+                if failures >= CAPTURE["fail_after"]:
+                    print(f"⚠️ Camera stopped delivering frames; reconnecting in {backoff:.1f}s")
+                    self._close()
+                    self.reconnects += 1
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, CAPTURE["backoff_max"])
+                continue
+            ts = time.monotonic()
+            failures = 0
+            backoff = CAPTURE["backoff_min"]
+            self.grabbed += 1
+            with self._cond:
+                want = self._waiting > 0
+            if not want:
+                continue          # nobody waiting: grabbing keeps the driver queue empty, no decode
+            ok, frame = self.device.retrieve()
+            if not ok:
+                continue
+            with self._cond:
+                self._frame, self._frame_ts = frame, ts
+                self._seq += 1
+                self._cond.notify_all()
+        self._close()
+
+    def read(self, timeout=2.0, with_seq=False):
+        """
+        Next frame newer than the last one this thread got, or None (timeout / stopped).
+        Each call returns its own copy: viewers draw on their frame, and that must
+        not reach another viewer's JPEG or recognition input. with_seq=True returns
+        (sequence number, frame), so consumers can tell they got the same frame.
+        """
+        deadline = time.monotonic() + timeout
+        seen = getattr(self._cursor, "seq", 0)
+        with self._cond:
+            self._waiting += 1
+            try:
+                while self._seq <= seen:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._stop.is_set():
+                        return (None, None) if with_seq else None
+                    self._cond.wait(remaining)
+                self._cursor.seq = self._seq
+                self.age_ms.append((time.monotonic() - self._frame_ts) * 1000.0)
+                frame = self._frame.copy()
+                return (self._seq, frame) if with_seq else frame
+            finally:
+                self._waiting -= 1
+
+    def stats(self):
+        ages = sorted(self.age_ms)
+        return {
+            "connected": self.connected,
+            "negotiated": self.negotiated,
+            "grabbed": self.grabbed,
+            "decoded": self._seq,
+            "skipped": self.grabbed - self._seq,     # grabbed but never decoded: the lag we avoided
+            "readers": self._waiting,
+            "reconnects": self.reconnects,
+            "frame_age_p50_ms": round(ages[len(ages) // 2], 1) if ages else None,
+            "frame_age_max_ms": round(ages[-1], 1) if ages else None,
+        }
@@ -0,0 +1,206 @@
+import os
+import time
+import datetime
+import threading
+from modules.attendance_policy import WEEKDAYS, get_policy
+
+# Timetable-driven recognition rate plus a CPU / memory governor.
+#
+# Almost every mark of the day happens in the minutes around a session start,
+# yet the live loops used to recognise every frame around the clock. Each
+# camera now runs in one of three modes:
+#   full   from `lead` before a session start until `ramp_down` after it
+#   low    the rest of the school day (late arrivals, people passing by)
+#   idle   outside the school day, and on days the camera has no sessions
+# Session starts come from the camera's timetable (the camera_shards schedule,
+# one entry per class) or, for a camera without one, from the late cutoff of
+# the attendance policy (09:15 by default).
+#
+# The mode only paces an empty scene. As soon as a recognised frame shows a
+# face (pending, unknown, too blurry, marked...) every frame is recognised
+# again until none has been seen for `face_hold` seconds: confirmation
+# policies count frames (ConsecutivePolicy, the liveness blink / stable-frame
+# counters) and drop tracks after CONFIG["stale_after"], so a face in view is
+# never seen at a reduced rate.
+#
+# The governor samples system CPU and memory and lowers a shared level while
+# the box is saturated (multiplicative decrease, additive recovery). Cameras
+# in low / idle mode shed load first; cameras in a session start window only
+# once the level drops below one half. Like the mode, it only slows the
+# polling of empty scenes.
+
+SCHEDULE = {
+    "lead": 20,                          # minutes before a session start at full rate
+    "ramp_down": 25,                     # minutes after it (covers the late cutoff)
+    "day": ("07:00:00", "18:00:00"),     # low rate in between, idle outside
+    "rates": {"full": 15.0, "low": 2.0, "idle": 0.5},   # empty-scene recognitions per second per camera
+    "idle_stream_fps": 2.0,              # preview frames per second while idle
+    "face_hold": 3.0,                    # seconds of every-frame recognition after a face was seen
+    "reload_every": 60.0,                # seconds between timetable reads
+}
+
+GOVERNOR = {
+    "cpu_high": 0.85,       # share of all cores busy
+    "mem_high": 0.90,       # share of RAM in use
+    "interval": 2.0,        # seconds between samples
+    "decrease": 0.7,
+    "increase": 0.1,
+    "min_level": 0.1,
+}
+
+
+def _shift(time_str, minutes):
+    t = datetime.datetime.strptime(time_str, "%H:%M:%S") + datetime.timedelta(minutes=minutes)
+    return t.strftime("%H:%M:%S") if t.day == 1 else ("00:00:00" if minutes < 0 else "23:59:59")
+
+
+class CaptureScheduler:
+    """Mode of one camera at a given time, from its timetable (re-read every reload_every seconds)."""
+
+    def __init__(self, storage=None, camera_id=None, **overrides):
+        self.cfg = dict(SCHEDULE, **overrides)
+        self.storage = storage
+        self.camera_id = camera_id
+        self._timetable = []
+        self._loaded_at = float("-inf")
+
+    def _entries(self):
+        if self.storage is None:
+            return []
+        if time.monotonic() - self._loaded_at > self.cfg["reload_every"]:
+            try:
+                self._timetable = self.storage.camera_schedule(self.camera_id)
+            except Exception as e:
+                print(f"⚠️ Could not load timetable for camera {self.camera_id}: {e}")
+            self._loaded_at = time.monotonic()
+        return self._timetable
+
+    def session_starts(self, now_dt):
+        """Session start times ("HH:MM:SS") for now_dt's day."""
+        entries = self._entries()
+        if not entries:
+            return [get_policy().cutoff(now_dt.strftime("%Y-%m-%d"))]
+        weekday = WEEKDAYS[now_dt.weekday()]
+        return sorted({e["start"] for e in entries if e["weekday"] in (None, "", weekday)})
+
+    def mode(self, now_dt):
+        now_str = now_dt.strftime("%H:%M:%S")
+        starts = self.session_starts(now_dt)
+        for start in starts:
+            if _shift(start, -self.cfg["lead"]) <= now_str <= _shift(start, self.cfg["ramp_down"]):
+                return "full"
+        day_start, day_end = self.cfg["day"]
+        if starts and day_start <= now_str <= day_end:
+            return "low"
+        return "idle"
+
+
+def _system_load():
+    """(cpu, memory) in use as shares of the machine; psutil if installed, /proc otherwise."""
+    try:
+        import psutil
+
+        return psutil.cpu_percent(None) / 100.0, psutil.virtual_memory().percent / 100.0
+    except ImportError:
+        pass
+    cpu = os.getloadavg()[0] / (os.cpu_count() or 1)
+    mem = 0.0
+    try:
+        info = {}
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                info[key] = int(value.split()[0])
+        mem = 1.0 - info["MemAvailable"] / float(info["MemTotal"])
+    except (OSError, KeyError, ValueError):
+        pass
+    return cpu, mem
+
+
+class ResourceGovernor:
+    """Process-wide load level in [min_level, 1]; every camera's rate is scaled by it."""
+
+    def __init__(self, sample=_system_load, **overrides):
+        self.cfg = dict(GOVERNOR, **overrides)
+        self.sample = sample
+        self.level = 1.0
+        self.cpu = 0.0
+        self.mem = 0.0
+        self.saturated_samples = 0
+        self._sampled_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _update(self, now):
+        with self._lock:
+            if now - self._sampled_at < self.cfg["interval"]:
+                return
+            self._sampled_at = now
+            self.cpu, self.mem = self.sample()
+            if self.cpu > self.cfg["cpu_high"] or self.mem > self.cfg["mem_high"]:
+                self.saturated_samples += 1
+                self.level = max(self.cfg["min_level"], self.level * self.cfg["decrease"])
+            else:
+                self.level = min(1.0, self.level + self.cfg["increase"])
+
+    def scale(self, mode, now):
+        """Rate multiplier for a camera in `mode`; session start windows are shed last."""
+        self._update(now)
+        if mode == "full":
+            return min(1.0, self.level * 2.0)
+        return self.level
+
+    def stats(self):
+        return {"level": round(self.level, 2), "cpu": round(self.cpu, 2), "memory": round(self.mem, 2),
+                "saturated_samples": self.saturated_samples}
+
+
+class FramePacer:
+    """
+    Per camera loop: which frames to run recognition on. decide() returns
+    (recognise, sleep): recognise this frame or only show it, and how long
+    to wait before reading the next one (idle mode slows the preview too).
+    Call saw() with the results of every recognised frame.
+    """
+
+    def __init__(self, scheduler, governor=None):
+        self.scheduler = scheduler
+        self.governor = governor
+        self.mode = None
+        self._mode_at = float("-inf")
+        self._last = float("-inf")
+        self._faces_at = float("-inf")
+        self.frames = 0
+        self.recognised = 0
+
+    def decide(self, now=None, now_dt=None):
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        if now - self._mode_at >= 1.0:
+            mode = self.scheduler.mode(now_dt or datetime.datetime.now())
+            if mode != self.mode:
+                print(f"🕘 Camera {self.scheduler.camera_id or 'local'}: {self.mode or 'start'} -> {mode}")
+                self.mode = mode
+            self._mode_at = now
+        if now - self._faces_at < self.scheduler.cfg["face_hold"]:
+            self._last = now
+            self.recognised += 1
+            return True, 0.0
+        rate = self.scheduler.cfg["rates"][self.mode]
+        if self.governor is not None:
+            # never below the idle rate, so someone walking up is still noticed within seconds
+            rate = max(self.scheduler.cfg["rates"]["idle"], rate * self.governor.scale(self.mode, now))
+        recognise = now - self._last >= 1.0 / rate
+        if recognise:
+            self._last = now
+            self.recognised += 1
+        sleep = 1.0 / self.scheduler.cfg["idle_stream_fps"] if self.mode == "idle" else 0.0
+        return recognise, sleep
+
+    def saw(self, results, now=None):
+        """Results of a recognised frame; any face switches back to every-frame recognition."""
+        if results:
+            self._faces_at = time.monotonic() if now is None else now
+
+    def stats(self):
+        return {"mode": self.mode, "frames": self.frames, "recognised": self.recognised,
+                "face_in_view": time.monotonic() - self._faces_at < self.scheduler.cfg["face_hold"]}
@@ -0,0 +1,172 @@
+import os
+
+# Face detector backends. Every detector takes an RGB frame and returns boxes
+# as (top, right, bottom, left), the face_recognition convention used by the
+# rest of the pipeline.
+#
+#   "hog"                            face_recognition's HOG detector (the default)
+#   "haar"                           OpenCV Haar cascade (ships with cv2)
+#   "yunet[:model.onnx]"             OpenCV YuNet DNN
+#   "ssd[:deploy.prototxt,model.caffemodel]"   OpenCV ResNet-10 SSD
+#   "cascade:<fast>><confirm>"       e.g. "cascade:haar>hog": the fast detector
+#                                    proposes, the expensive one confirms each
+#                                    proposal on a small crop only
+#
+# DNN model files are not bundled; by default they are looked up in models/.
+# Speed / recall per backend: benchmarks/detector_benchmark.py.
+
+MODELS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models"))
+YUNET_MODEL = "face_detection_yunet_2023mar.onnx"
+SSD_PROTOTXT = "deploy.prototxt"
+SSD_MODEL = "res10_300x300_ssd_iter_140000.caffemodel"
+
+
+def _clip(box, h, w):
+    top, right, bottom, left = box
+    return (max(0, int(top)), min(w, int(right)), min(h, int(bottom)), max(0, int(left)))
+
+
+def _from_xywh(x, y, bw, bh, h, w):
+    return _clip((y, x + bw, y + bh, x), h, w)
+
+
+def _model_path(path, default):
+    path = path or os.path.join(MODELS_DIR, default)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Detector model not found: {path}")
+    return path
+
+
+class HOGDetector:
+    name = "hog"
+
+    def __init__(self, upsample=1):
+        self.upsample = upsample
+
+    def detect(self, rgb):
+        import face_recognition
+
+        return face_recognition.face_locations(rgb, self.upsample)
+
+
+class HaarDetector:
+    name = "haar"
+
+    def __init__(self, cascade_path=None, scale_factor=1.1, min_neighbors=5, min_size=24):
+        import cv2
+
+        path = cascade_path or os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml")
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise FileNotFoundError(f"Haar cascade not found: {path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+
+    def detect(self, rgb):
+        import cv2
+
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        h, w = rgb.shape[:2]
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                              minSize=(self.min_size, self.min_size))
+        return [_from_xywh(x, y, bw, bh, h, w) for (x, y, bw, bh) in faces]
+
+
+class YuNetDetector:
+    name = "yunet"
+
+    def __init__(self, model_path=None, score_threshold=0.8):
+        import cv2
+
+        path = _model_path(model_path, YUNET_MODEL)
+        self.net = cv2.FaceDetectorYN.create(path, "", (320, 320), score_threshold)
+        self.size = None
+
+    def detect(self, rgb):
+        import cv2
+
+        h, w = rgb.shape[:2]
+        if self.size != (w, h):
+            self.net.setInputSize((w, h))
+            self.size = (w, h)
+        _, faces = self.net.detect(cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+        if faces is None:
+            return []
+        return [_from_xywh(f[0], f[1], f[2], f[3], h, w) for f in faces]
+
+
+class SSDDetector:
+    name = "ssd"
+
+    def __init__(self, prototxt=None, model_path=None, confidence=0.5):
+        import cv2
+
+        self.net = cv2.dnn.readNetFromCaffe(_model_path(prototxt, SSD_PROTOTXT), _model_path(model_path, SSD_MODEL))
+        self.confidence = confidence
+
+    def detect(self, rgb):
+        import cv2
+
+        h, w = rgb.shape[:2]
+        bgr = cv2.cvtColor(cv2.resize(rgb, (300, 300)), cv2.COLOR_RGB2BGR)
+        blob = cv2.dnn.blobFromImage(bgr, 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        out = self.net.forward()[0, 0]
+        boxes = []
+        for det in out[out[:, 2] >= self.confidence]:
+            x1, y1, x2, y2 = det[3] * w, det[4] * h, det[5] * w, det[6] * h
+            boxes.append(_clip((y1, x2, y2, x1), h, w))
+        return [b for b in boxes if b[2] > b[0] and b[1] > b[3]]
+
+
+class CascadeDetector:
+    """
+    Fast detector first, expensive detector only on padded crops around its
+    proposals. Every `full_every` frames the confirming detector also runs on
+    the whole frame, so faces the fast one misses are still found eventually.
+    """
+
+    def __init__(self, fast, confirm, pad=0.4, full_every=30):
+        self.fast = fast
+        self.confirm = confirm
+        self.pad = pad
+        self.full_every = full_every
+        self.frames = 0
+        self.name = f"cascade:{fast.name}>{confirm.name}"
+
+    def detect(self, rgb):
+        import numpy as np
+
+        self.frames += 1
+        if self.full_every and self.frames % self.full_every == 0:
+            return self.confirm.detect(rgb)
+        h, w = rgb.shape[:2]
+        found = []
+        for top, right, bottom, left in self.fast.detect(rgb):
+            ph, pw = int((bottom - top) * self.pad), int((right - left) * self.pad)
+            t, r, b, l = _clip((top - ph, right + pw, bottom + ph, left - pw), h, w)
+            crop = np.ascontiguousarray(rgb[t:b, l:r])
+            for ct, cr, cb, cl in self.confirm.detect(crop):
+                box = (ct + t, cr + l, cb + t, cl + l)
+                if box not in found:
+                    found.append(box)
+        return found
+
+
+def make_detector(spec="hog"):
+    """Detector from a spec string (see the table at the top of this module)."""
+    kind, _, arg = spec.partition(":")
+    if kind == "hog":
+        return HOGDetector(int(arg) if arg else 1)
+    if kind == "haar":
+        return HaarDetector(arg or None)
+    if kind == "yunet":
+        return YuNetDetector(arg or None)
+    if kind == "ssd":
+        prototxt, _, model = arg.partition(",")
+        return SSDDetector(prototxt or None, model or None)
+    if kind == "cascade":
+        fast, _, confirm = arg.partition(">")
+        return CascadeDetector(make_detector(fast or "haar"), make_detector(confirm or "hog"))
+    raise ValueError(f"Unknown detector: {spec}")
@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import queue
+import atexit
+import shutil
+import threading
+from urllib.parse import quote
+
+# Write-ahead log for attendance marks.
+#
+#   <dir>/events-<day>.log   one JSON line per mark, append-only
+#   <dir>/checkpoint.json    per sink: [segment, byte offset] applied so far
+#   <dir>/claims/<day>/<token>   one file per mark holding the claiming pid, created with O_EXCL
+#   <dir>/replay.lock        held by the worker currently replaying
+#
+# Recognition only enqueues (plus, once per student per day, a claim file;
+# it never waits on the database). A writer
+# thread appends whatever is queued, fsyncs once per batch (group commit),
+# then replays the log into the sinks from each sink's checkpoint. Sinks are
+# idempotent per (token_no, day), so replaying an event twice after a crash
+# is harmless, and a sink that fails (locked DB, full disk) simply stays
+# behind its checkpoint and catches up on the next batch. Listeners (e.g.
+# the SSE hub) get each batch once it has been appended and replayed.
+#
+# Worker processes can share one directory: a mark is new only if its claim
+# file could be created, and only the worker holding replay.lock replays,
+# starting from the checkpoint on disk, so every event reaches each sink
+# once. A student already in the attendance table from before the claim
+# (e.g. claims pruned) is logged again and the table's unique index keeps
+# the first row at replay.
+
+FLUSH_INTERVAL = 0.05   # seconds a batch may wait for more marks before the fsync
+MAX_BATCH = 256
+RETRY_AFTER = 2.0       # seconds between replays while a sink is failing
+LOCK_STALE_AFTER = 60.0 # seconds; a replay lock older than this was left by a crashed worker
+
+
+def _sink_name(sink):
+    return getattr(sink, "name", None) or type(sink).__name__
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass
+    return True
+
+
+class EventLog:
+    """
+    Sink for RecognitionEngine that makes marks durable before they reach
+    the relational store / CSV files. mark() returns immediately.
+    """
+
+    def __init__(self, directory, sinks, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH, listeners=None):
+        self.directory = directory
+        self.sinks = list(sinks)
+        self.listeners = list(listeners or [])
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._seen_day = None
+        self._seen = set()
+        self._thread = None
+        self._atexit = False
+        self._stop = threading.Event()
+        self._dirty = False
+        self.appended = 0
+        self.batches = 0
+        os.makedirs(directory, exist_ok=True)
+        self.checkpoint = self._load_checkpoint()
+
+    # ---------- Files ----------
+    def _segment(self, day):
+        return f"events-{day}.log"
+
+    def _segments(self):
+        return sorted(fn for fn in os.listdir(self.directory)
+                      if fn.startswith("events-") and fn.endswith(".log"))
+
+    def _load_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, "checkpoint.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_checkpoint(self):
+        path = os.path.join(self.directory, "checkpoint.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.checkpoint, f)
+        os.replace(tmp, path)
+
+    def _acquire(self):
+        lock = os.path.join(self.directory, "replay.lock")
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > LOCK_STALE_AFTER:
+                    os.remove(lock)
+                    return self._acquire()
+            except FileNotFoundError:
+                return self._acquire()
+            return False
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+
+    def _release(self):
+        try:
+            os.remove(os.path.join(self.directory, "replay.lock"))
+        except FileNotFoundError:
+            pass
+
+    def _read(self, segment, offset):
+        """Complete events after offset as (event, end offset); a torn last line is left for later."""
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        out = []
+        pos = offset
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            pos += len(line)
+            try:
+                out.append((json.loads(line), pos))
+            except ValueError:
+                print(f"⚠️ Skipping corrupt event in {segment} at byte {pos - len(line)}")
+        return out
+
+    # ---------- Recording ----------
+    def _load_seen(self, day):
+        self._seen_day = day
+        self._seen = set()
+        path = os.path.join(self.directory, self._segment(day))
+        if os.path.exists(path):
+            self._seen = {ev["token_no"] for ev, _ in self._read(self._segment(day), 0)}
+
+    def _claim(self, token_no, day):
+        """True for the first mark of (token, day) across every process sharing the directory."""
+        folder = os.path.join(self.directory, "claims", day)
+        os.makedirs(folder, exist_ok=True)
+        try:
+            fd = os.open(os.path.join(folder, quote(str(token_no), safe="")), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+
+    def mark(self, token_no, name, day, time_str, status):
+        """Queue a mark; False if this token was already marked for the day (by any worker)."""
+        with self._lock:
+            if day != self._seen_day:
+                self._load_seen(day)
+            if token_no in self._seen:
+                return False
+            self._seen.add(token_no)
+            if not self._claim(token_no, day):
+                return False
+        self._queue.put({"token_no": token_no, "name": name, "date": day,
+                         "time": time_str, "status": status, "ts": time.time()})
+        self.start()
+        return True
+
+    def start(self):
+        """Start the writer, or restart it if it died."""
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if (self._thread is None or not self._thread.is_alive()) and not self._stop.is_set():
+                    self._thread = threading.Thread(target=self._writer, name="event-log", daemon=True)
+                    self._thread.start()
+                    if not self._atexit:
+                        atexit.register(self.close)
+                        self._atexit = True
+
+    def close(self, timeout=5.0):
+        """Flush everything queued and stop the writer."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # ---------- Writer ----------
+    def _take_batch(self):
+        try:
+            batch = [self._queue.get(timeout=RETRY_AFTER if self._dirty else 0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _append(self, batch):
+        by_day = {}
+        for ev in batch:
+            by_day.setdefault(ev["date"], []).append(ev)
+        for day, events in by_day.items():
+            path = os.path.join(self.directory, self._segment(day))
+            with open(path, "ab") as f:
+                f.write(b"".join(json.dumps(ev).encode() + b"\n" for ev in events))
+                f.flush()
+                os.fsync(f.fileno())
+        self.appended += len(batch)
+        self.batches += 1
+
+    def _safe_replay(self):
+        try:
+            self.replay()
+        except Exception as e:
+            # e.g. the checkpoint could not be written: keep the writer alive and try again
+            print(f"❌ Event log replay failed, will retry: {e}")
+            self._dirty = True
+
+    def _claim_owner_gone(self, claim_path):
+        """True once the process that wrote the claim has exited."""
+        try:
+            with open(claim_path) as f:
+                pid = int(f.read().strip())
+        except FileNotFoundError:
+            return False
+        except ValueError:
+            # empty: the owner may still be between O_EXCL and writing its pid
+            return time.time() - os.path.getmtime(claim_path) > LOCK_STALE_AFTER
+        return not _pid_alive(pid)
+
+    def _release_lost_claims(self):
+        """
+        Claims whose event never reached the log (the process died with it
+        still queued) would block that student for the rest of the day. A
+        claim of a live worker is kept: its event may still be in that
+        worker's queue.
+        """
+        folder = os.path.join(self.directory, "claims")
+        if not os.path.isdir(folder):
+            return
+        for day in os.listdir(folder):
+            path = os.path.join(self.directory, self._segment(day))
+            logged = set()
+            if os.path.exists(path):
+                logged = {quote(str(ev["token_no"]), safe="") for ev, _ in self._read(self._segment(day), 0)}
+            for claim in os.listdir(os.path.join(folder, day)):
+                claim_path = os.path.join(folder, day, claim)
+                if claim not in logged and self._claim_owner_gone(claim_path):
+                    os.remove(claim_path)
+                    print(f"♻️ Released unlogged claim {day}/{claim}")
+
+    def _writer(self):
+        try:
+            self._release_lost_claims()
+        except OSError as e:
+            print(f"⚠️ Could not check event log claims: {e}")
+        self._safe_replay()   # anything logged but not applied before the last shutdown
+        while True:
+            batch = self._take_batch()
+            if batch:
+                try:
+                    self._append(batch)
+                except OSError as e:
+                    # could not make them durable: keep them queued rather than drop them
+                    print(f"❌ Event log append failed, will retry: {e}")
+                    for ev in batch:
+                        self._queue.put(ev)
+                    time.sleep(RETRY_AFTER)
+                    continue
+            if batch or self._dirty:
+                self._safe_replay()
+            if batch:
+                for listener in self.listeners:
+                    try:
+                        listener(batch)
+                    except Exception as e:
+                        print(f"⚠️ Event listener failed: {e}")
+            if self._stop.is_set() and self._queue.empty():
+                return
+
+    # ---------- Replay ----------
+    def replay(self):
+        """Apply every logged event each sink has not seen yet. Returns the number applied."""
+        if not self._acquire():
+            self._dirty = True     # another worker is replaying; look again after RETRY_AFTER
+            return 0
+        try:
+            return self._replay()
+        finally:
+            self._release()
+
+    def _replay(self):
+        applied = 0
+        self._dirty = False
+        self.checkpoint = self._load_checkpoint()   # other workers may have moved it
+        segments = self._segments()
+        for sink in self.sinks:
+            name = _sink_name(sink)
+            seg, offset = self.checkpoint.get(name, [None, 0])
+            for segment in segments:
+                if seg is not None and segment < seg:
+                    continue
+                start = offset if segment == seg else 0
+                try:
+                    for ev, end in self._read(segment, start):
+                        sink.mark(ev["token_no"], ev["name"], ev["date"], ev["time"], ev["status"])
+                        self.checkpoint[name] = [segment, end]
+                        applied += 1
+                except Exception as e:
+                    print(f"❌ {name} is behind the event log ({e}); will replay")
+                    self._dirty = True
+                    break
+        if applied:
+            self._save_checkpoint()
+        return applied
+
+    def lag(self):
+        """Events logged but not yet applied, per sink (for /readyz)."""
+        out = {}
+        for sink in self.sinks:
+            name = _sink_name(sink)
+            seg, offset = self.checkpoint.get(name, [None, 0])
+            out[name] = sum(len(self._read(s, offset if s == seg else 0))
+                            for s in self._segments() if seg is None or s >= seg)
+        return out
+
+    def prune(self, before_day):
+        """Delete segments older than before_day that every sink has moved past. Returns the count."""
+        checkpoint = self._load_checkpoint()
+        positions = [checkpoint.get(_sink_name(sink), [None, 0])[0] for sink in self.sinks]
+        if not positions or None in positions:
+            return 0
+        removed = 0
+        for segment in self._segments():
+            if segment < self._segment(before_day) and segment < min(positions):
+                os.remove(os.path.join(self.directory, segment))
+                removed += 1
+        claims = os.path.join(self.directory, "claims")
+        if os.path.isdir(claims):
+            for day in os.listdir(claims):
+                if day < before_day:
+                    shutil.rmtree(os.path.join(claims, day), ignore_errors=True)
+        return removed
@@ -1,95 +1,78 @@
-import sqlite3
-import pandas as pd
 import os
 from datetime import date, datetime
+from modules.attendance_policy import get_policy
 
-def get_status(time_str):
+def get_status(time_str, day=None):
     """Return attendance status based on time (On Time / Late)."""
     try:
-        time_obj = datetime.strptime(time_str, "%H:%M:%S").time()
-        cutoff = datetime.strptime("09:15:00", "%H:%M:%S").time()
-        return "Late" if time_obj > cutoff else "On Time"
+        datetime.strptime(time_str, "%H:%M:%S")
+        return get_policy().status(time_str, day or date.today().isoformat())
     except Exception:
         return "Unknown"
 
-def export_attendance_csv(db_path, out_path):
-    """Export today's attendance as CSV with On Time / Late/Absent status."""
-    today = date.today().isoformat()
+def _attendance_frame(storage, day=None, policy=None, archive_dir=None):
+    """
+    Present + absent students for one day as a DataFrame
+    (token_no, name, date, time, Status). Status of present students is one
+    vectorised comparison against the policy cutoff, not a per-row parse.
+    Days the nightly job has moved out of the hot table are read from the
+    archive in archive_dir.
+    """
+    import pandas as pd
+
+    day = day or date.today().isoformat()
+    policy = policy or get_policy()
 
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query(
-        "SELECT token_no, name, date, time FROM attendance WHERE date=? ORDER BY time ASC",
-        conn,
-        params=(today,)
-    )
+    df = pd.DataFrame([r[:4] for r in storage.attendance_for_day(day)],
+                      columns=["token_no", "name", "date", "time"])
+    if df.empty and archive_dir:
+        df = _archived_day(archive_dir, day)
 
-    # Status for present students
+    # Status for present students (per-class cutoffs via the students' class shards)
     if not df.empty:
-        df["Status"] = df["time"].apply(get_status)
+        classes = None
+        if policy.by_class:
+            members = storage.shard_memberships()
+            classes = [policy.class_of(t, lambda s: members.get(s, ())) for t in df["token_no"]]
+        df["Status"] = policy.status_series(df["time"], df["date"], classes)
     else:
         df["Status"] = []
 
     # Fetch absent students
-    absent_query = """
-        SELECT token_no, name FROM students
-        WHERE token_no NOT IN (
-            SELECT token_no FROM attendance WHERE date=?
-        )
-        ORDER BY name ASC
-    """
-    absent_students = pd.read_sql_query(absent_query, conn, params=(today,))
-    conn.close()
+    absent_students = pd.DataFrame(storage.absent_for_day(day), columns=["token_no", "name"])
+    absent_students = absent_students[~absent_students["token_no"].isin(df["token_no"])]
 
     if not absent_students.empty:
-        absent_students["date"] = today
+        absent_students["date"] = day
         absent_students["time"] = "--:--:--"
         absent_students["Status"] = "Absent"
 
     # Combine present and absent DataFrames
     export_df = pd.concat([df, absent_students], ignore_index=True, sort=False)
-    export_df = export_df[["token_no", "name", "date", "time", "Status"]]  # Ensure column order
+    return export_df[["token_no", "name", "date", "time", "Status"]]  # Ensure column order
+
+def _archived_day(archive_dir, day):
+    """An archived day's marks (no pyarrow means nothing was ever archived)."""
+    import pandas as pd
+    from modules.archive import read_archive
+
+    columns = ["token_no", "name", "date", "time"]
+    try:
+        df = read_archive(archive_dir, day, day, columns=columns)
+    except (RuntimeError, ImportError):
+        return pd.DataFrame(columns=columns)
+    return df.sort_values("time", kind="stable").reset_index(drop=True)
 
+def export_attendance_csv(storage, out_path, day=None, archive_dir=None):
+    """Export a day's attendance (default today) as CSV with On Time / Late/Absent status."""
+    export_df = _attendance_frame(storage, day, archive_dir=archive_dir)
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     export_df.to_csv(out_path, index=False)
     print(f"✅ CSV exported successfully at: {out_path}")
 
-def export_attendance_excel(db_path, out_path):
-    """Export today's attendance as Excel with On Time / Late/Absent status."""
-    today = date.today().isoformat()
-
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query(
-        "SELECT token_no, name, date, time FROM attendance WHERE date=? ORDER BY time ASC",
-        conn,
-        params=(today,)
-    )
-
-    # Status for present students
-    if not df.empty:
-        df["Status"] = df["time"].apply(get_status)
-    else:
-        df["Status"] = []
-
-    # Fetch absent students
-    absent_query = """
-        SELECT token_no, name FROM students
-        WHERE token_no NOT IN (
-            SELECT token_no FROM attendance WHERE date=?
-        )
-        ORDER BY name ASC
-    """
-    absent_students = pd.read_sql_query(absent_query, conn, params=(today,))
-    conn.close()
-
-    if not absent_students.empty:
-        absent_students["date"] = today
-        absent_students["time"] = "--:--:--"
-        absent_students["Status"] = "Absent"
-
-    # Combine present and absent DataFrames
-    export_df = pd.concat([df, absent_students], ignore_index=True, sort=False)
-    export_df = export_df[["token_no", "name", "date", "time", "Status"]]
-
+def export_attendance_excel(storage, out_path, day=None, archive_dir=None):
+    """Export a day's attendance (default today) as Excel with On Time / Late/Absent status."""
+    export_df = _attendance_frame(storage, day, archive_dir=archive_dir)
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     export_df.to_excel(out_path, index=False)
     print(f"✅ Excel exported successfully at: {out_path}")
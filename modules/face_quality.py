@@ -0,0 +1,180 @@
+import numpy as np
+
+# Face quality gate, run between detection and the 128-d encoder.
+#
+# A tiny, blurred, badly lit or side-on face costs a full encoding and then
+# usually ends up "Unknown" or as a weak match that needs extra confirmation
+# frames. Each detected face gets cheap checks first:
+#   size        shorter box side in pixels of the recognition-sized frame
+#   sharpness   variance of the Laplacian of the grey crop
+#   brightness  mean grey level of the crop
+#   pose        yaw from the landmarks: nose offset from the eye midpoint / eye distance
+# and only faces passing all of them are encoded. The gate's landmarks are
+# handed on instead of being thrown away: 5-point shapes are the ones the
+# 128-d encoder aligns a face with, so encode() reuses them, and 68-point
+# ones (landmark_model="large", used with the liveness check) carry the eye
+# contours the blink detector needs. The combined score picks the crop kept
+# for an unknown face (modules/unknown_faces.py).
+#
+# Reusing dlib shapes goes through face_recognition.api internals; if an
+# installed version doesn't have them, everything falls back to the public
+# face_landmarks / face_encodings calls (one extra landmark pass, as before).
+
+QUALITY = {
+    "min_side": 40,
+    "min_sharpness": 40.0,
+    "brightness": (40, 220),
+    "max_yaw": 0.5,          # ~0 frontal; a full profile is > 1
+    "sharpness_good": 300.0, # sharpness at which the score saturates
+}
+
+
+def _crop(rgb, loc):
+    top, right, bottom, left = loc
+    return rgb[max(0, top):bottom, max(0, left):right]
+
+
+def sharpness(grey):
+    import cv2
+
+    return float(cv2.Laplacian(grey, cv2.CV_64F).var())
+
+
+# point ranges of each feature, as face_recognition.face_landmarks names them
+_FEATURES = {
+    "small": {"right_eye": (0, 2), "left_eye": (2, 4), "nose_tip": (4, 5)},
+    "large": {"nose_tip": (31, 36), "left_eye": (36, 42), "right_eye": (42, 48)},
+}
+_fallback_warned = []
+
+
+def _fallback(e):
+    if not _fallback_warned:
+        _fallback_warned.append(e)
+        print(f"⚠️ face_recognition internals unavailable ({e}); using face_landmarks / face_encodings")
+
+
+def landmarks(rgb, locations, model="small"):
+    """
+    Landmarks per face as face_landmarks-style dicts of point arrays, plus
+    "shape" (the dlib shape, or None on the fallback path) and "model".
+    """
+    import face_recognition
+
+    try:
+        shapes = face_recognition.api._raw_face_landmarks(rgb, locations, model=model)
+        out = []
+        for shape in shapes:
+            p = np.array([(pt.x, pt.y) for pt in shape.parts()], dtype=np.float32)
+            lm = {name: p[a:b] for name, (a, b) in _FEATURES[model].items()}
+            lm["shape"], lm["model"] = shape, model
+            out.append(lm)
+        return out
+    except (AttributeError, TypeError) as e:
+        _fallback(e)
+    out = []
+    for lm in face_recognition.face_landmarks(rgb, face_locations=locations, model=model):
+        lm = {k: np.asarray(v, dtype=np.float32) for k, v in lm.items()}
+        lm["shape"], lm["model"] = None, model
+        out.append(lm)
+    return out
+
+
+def yaw_ratio(lm):
+    """|nose - eye midpoint| / eye distance for one face's landmarks."""
+    try:
+        left = lm["left_eye"].mean(axis=0)
+        right = lm["right_eye"].mean(axis=0)
+        nose = lm["nose_tip"].mean(axis=0)
+    except KeyError:
+        return 0.0
+    eye_dist = max(float(np.linalg.norm(right - left)), 1.0)
+    return abs(float(nose[0] - (left[0] + right[0]) / 2.0)) / eye_dist
+
+
+def encode(rgb, locations, marks=None):
+    """
+    128-d encodings. With the gate's 5-point landmarks the encoder skips its
+    own landmark pass (68-point shapes are not reused: the gallery was
+    encoded from 5-point alignment).
+    """
+    import face_recognition
+
+    if marks and all(m["shape"] is not None and m["model"] == "small" for m in marks):
+        try:
+            encoder = face_recognition.api.face_encoder
+            return [np.array(encoder.compute_face_descriptor(rgb, m["shape"], 1)) for m in marks]
+        except (AttributeError, TypeError) as e:
+            _fallback(e)
+    return face_recognition.face_encodings(rgb, locations)
+
+
+class QualityGate:
+
+    def __init__(self, check_pose=True, landmark_model="small", **overrides):
+        """
+        check_pose: reject side-on faces. landmark_model: "small" (reused by the
+        encoder), "large" (reused by LivenessPolicy) or None (no landmark pass).
+        """
+        self.cfg = dict(QUALITY, **overrides)
+        self.check_pose = check_pose
+        self.landmark_model = landmark_model or ("small" if check_pose else None)
+        self.checked = 0
+        self.rejected = 0
+
+    def filter(self, rgb, locations):
+        """
+        Split detections into faces worth encoding and rejects.
+        Returns (kept_locations, kept_scores, kept_landmarks, [(loc, reason), ...]);
+        kept_landmarks (see landmarks()) is None without a landmark model.
+        """
+        import cv2
+
+        kept, scores, marks, rejects = [], [], [], []
+        candidates = []
+        for loc in locations:
+            self.checked += 1
+            top, right, bottom, left = loc
+            side = min(bottom - top, right - left)
+            if side < self.cfg["min_side"]:
+                rejects.append((loc, "Move closer"))
+                continue
+            crop = _crop(rgb, loc)
+            if crop.size == 0:
+                rejects.append((loc, "Move into view"))
+                continue
+            grey = cv2.cvtColor(np.ascontiguousarray(crop), cv2.COLOR_RGB2GRAY)
+            level = float(grey.mean())
+            low, high = self.cfg["brightness"]
+            if not low <= level <= high:
+                rejects.append((loc, "Too dark" if level < low else "Too bright"))
+                continue
+            sharp = sharpness(grey)
+            if sharp < self.cfg["min_sharpness"]:
+                rejects.append((loc, "Hold still"))
+                continue
+            candidates.append((loc, side, sharp, level))
+
+        found = []
+        if self.landmark_model and candidates:
+            found = landmarks(rgb, [c[0] for c in candidates], self.landmark_model)
+        for i, (loc, side, sharp, level) in enumerate(candidates):
+            yaw = yaw_ratio(found[i]) if found else 0.0
+            if self.check_pose and yaw > self.cfg["max_yaw"]:
+                rejects.append((loc, "Face the camera"))
+                continue
+            low, high = self.cfg["brightness"]
+            score = (min(1.0, side / (3.0 * self.cfg["min_side"]))
+                     * min(1.0, sharp / self.cfg["sharpness_good"])
+                     * (1.0 - abs(level - (low + high) / 2.0) / (high - low))
+                     * (1.0 - min(1.0, yaw)))
+            kept.append(loc)
+            scores.append(score)
+            if found:
+                marks.append(found[i])
+        self.rejected += len(rejects)
+        return kept, scores, (marks if self.landmark_model else None), rejects
+
+    def stats(self):
+        return {"checked": self.checked, "rejected": self.rejected,
+                "rejected_ratio": round(self.rejected / self.checked, 3) if self.checked else 0.0}
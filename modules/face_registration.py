@@ -1,24 +1,24 @@
 import os
 import pickle
-import face_recognition
-import sqlite3
 
 
-def register_student_and_encode(db_path, image_path, token_no, name, enc_dir):
+def _already_registered(storage, token_no):
+    row = storage.get_student(token_no)
+    if row is not None:
+        print(f"⚠️ Token {token_no} is already registered for {row[1]}.")
+    return row is not None
+
+
+def register_student_and_encode(storage, image_path, token_no, name, enc_dir):
     """
     Registers a new student, generates their face encoding,
-    saves it as a .pkl file (safe format) and updates DB.
+    saves it as a .pkl file (safe format) and updates the storage backend,
+    whose shared gallery other app instances pick the encoding up from.
     """
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
+    import face_recognition
 
     # ✅ DUPLICATE CHECK
-    cur.execute("SELECT name FROM students WHERE token_no = ?", (token_no,))
-    row = cur.fetchone()
-    if row is not None:
-        existing_name = row[0]
-        conn.close()
-        print(f"⚠️ Token {token_no} is already registered for {existing_name}.")
+    if _already_registered(storage, token_no):
         return False
 
     # ✅ FACE ENCODING
@@ -26,13 +26,28 @@ def register_student_and_encode(db_path, image_path, token_no, name, enc_dir):
     encs = face_recognition.face_encodings(image)
 
     if len(encs) == 0:
-        conn.close()
         raise ValueError("No face detected in uploaded image.")
 
-    encoding = encs[0]
+    return register_student_with_encoding(storage, image_path, token_no, name, enc_dir, encs[0])
+
+
+def register_student_with_encoding(storage, image_path, token_no, name, enc_dir, encoding):
+    """
+    Same as register_student_and_encode for an encoding that is already known
+    (e.g. an unknown-face cluster from the live feed), so nothing is re-encoded.
+    """
+    if _already_registered(storage, token_no):
+        return False
+
     os.makedirs(enc_dir, exist_ok=True)
     pkl_path = os.path.join(enc_dir, f"{token_no}.pkl")
 
+    # ✅ INSERT first (the unique token_no settles a race between two
+    # registrations; the loser must not overwrite the winner's .pkl)
+    if not storage.add_student(token_no, name, image_path, pkl_path):
+        print(f"⚠️ Token {token_no} was registered meanwhile.")
+        return False
+
     to_save = {
         "token_no": token_no,
         "name": name,
@@ -42,13 +57,7 @@ def register_student_and_encode(db_path, image_path, token_no, name, enc_dir):
     with open(pkl_path, "wb") as f:
         pickle.dump(to_save, f)
 
-    # ✅ INSERT
-    cur.execute("""
-        INSERT OR IGNORE INTO students(token_no, name, photo_path, encoding_path)
-        VALUES (?, ?, ?, ?)
-    """, (token_no, name, image_path, pkl_path))
-    conn.commit()
-    conn.close()
+    storage.save_encoding(token_no, name, encoding)
 
     print(f"✅ Student {name} (Token: {token_no}) registered!")
     return True
@@ -0,0 +1,101 @@
+import threading
+import time
+from modules.utils import load_all_encodings
+from modules.startup import record
+
+
+class Gallery:
+    """
+    Known-face gallery (encodings, token_nos, names) shared by the app.
+    The three lists are swapped together as one tuple, so readers always see
+    a consistent snapshot while a reload is running in another thread.
+
+    With a storage backend (modules/storage.py) the gallery is read from the
+    shared encodings table, and refresh() pulls changes made by other app
+    instances by comparing version counters instead of reloading everything.
+    With a SharedGallery (modules/shared_gallery.py) as well, the encodings
+    are a read-only mmap shared by every worker process on the box.
+    """
+
+    def __init__(self, enc_dir, storage=None, shared=None):
+        self.enc_dir = enc_dir
+        self.storage = storage
+        self.shared = shared
+        self.version = 0
+        self.ready = threading.Event()
+        self._data = ([], [], [])
+        self._members = {}          # shard -> frozenset(token_no)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data[0])
+
+    def snapshot(self):
+        """(encodings, token_nos, names) as of the last completed load."""
+        return self._data
+
+    def members(self, shard):
+        """Tokens in a class/section/building shard (empty if unknown)."""
+        return self._members.get(shard, frozenset())
+
+    def _from_shared(self):
+        meta = self.shared.meta
+        self._data = (self.shared.matrix, meta["token_nos"], meta["names"])
+        self._members = {k: frozenset(v) for k, v in meta["members"].items()}
+        self.version = self.shared.generation
+
+    def load(self):
+        """(Re)load the whole gallery; safe to call from any thread."""
+        with self._lock:
+            start = time.perf_counter()
+            if self.shared is not None and self.storage is not None:
+                self.shared.sync(self.storage)
+            if self.shared is not None and self.shared.generation is not None:
+                self._from_shared()
+            elif self.storage is not None:
+                encs, ids, names, self.version = self.storage.load_gallery()
+                self._data = (encs, ids, names)
+                self._members = self.storage.shard_memberships()
+            else:
+                self._data = load_all_encodings(self.enc_dir)
+            elapsed = time.perf_counter() - start
+        if not self.ready.is_set():
+            record("gallery load (background)", elapsed)
+            print(f"📁 Gallery ready: {len(self)} encodings in {elapsed * 1000:.0f} ms")
+        self.ready.set()
+        return self._data
+
+    def refresh(self):
+        """Apply changes made since our version (by this or another instance). Returns True if anything changed."""
+        if self.storage is None or not self.ready.is_set():
+            return False
+        if self.storage.gallery_version() == self.version:
+            return False
+        if self.shared is not None:
+            with self._lock:
+                self.shared.sync(self.storage)
+                if self.shared.generation in (None, self.version):
+                    return False        # another worker is still publishing; try again later
+                self._from_shared()
+            print(f"🔁 Gallery mapped at generation {self.version}")
+            return True
+        with self._lock:
+            new_version, changed = self.storage.gallery_changes_since(self.version)
+            encs, ids, names = self._data
+            entries = {t: (n, e) for e, t, n in zip(encs, ids, names)}
+            for token_no, entry in changed.items():
+                if entry is None:
+                    entries.pop(token_no, None)
+                else:
+                    entries[token_no] = entry
+            ids = sorted(entries)
+            self._data = ([entries[t][1] for t in ids], ids, [entries[t][0] for t in ids])
+            self._members = self.storage.shard_memberships()
+            self.version = new_version
+        print(f"🔁 Gallery updated to version {new_version} ({len(changed)} changed)")
+        return True
+
+    def load_in_background(self):
+        t = threading.Thread(target=self.load, name="gallery-load", daemon=True)
+        t.start()
+        return t
@@ -0,0 +1,73 @@
+import json
+import queue
+import threading
+
+# In-process fan-out of attendance events to Server-Sent Events clients.
+# The event log publishes once per applied batch; every open dashboard has
+# its own bounded queue, so a slow browser can't hold up recognition or the
+# other screens. A client that falls too far behind gets a "resync" event
+# and reloads the page instead of silently missing marks.
+
+SUBSCRIBER_QUEUE = 200
+KEEPALIVE = 15.0   # seconds between SSE comments, keeps proxies from closing idle streams
+
+
+def format_sse(kind, data, event_id=None):
+    msg = f"event: {kind}\ndata: {json.dumps(data)}\n"
+    if event_id is not None:
+        msg = f"id: {event_id}\n" + msg
+    return msg + "\n"
+
+
+class EventHub:
+
+    def __init__(self, maxsize=SUBSCRIBER_QUEUE):
+        self.maxsize = maxsize
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._subs)
+
+    def subscribe(self):
+        q = queue.Queue(self.maxsize)
+        with self._lock:
+            self._subs.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subs.discard(q)
+
+    def publish(self, kind, data):
+        with self._lock:
+            self._seq += 1
+            msg = format_sse(kind, data, self._seq)
+            subs = list(self._subs)
+        for q in subs:
+            try:
+                q.put_nowait(msg)
+            except queue.Full:
+                self.unsubscribe(q)
+                try:
+                    q.get_nowait()
+                    q.put_nowait(format_sse("resync", {}))
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def stream(self, q, keepalive=KEEPALIVE):
+        """Generator for a Flask Response; unsubscribes when the client goes away."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    msg = q.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield msg
+                if msg.startswith("event: resync"):
+                    return
+        finally:
+            self.unsubscribe(q)
@@ -0,0 +1,126 @@
+import numpy as np
+from modules.track_state import TrackStore
+
+# ---------- Liveness parameters (same values the webcam loop always used) ----------
+BLINK_THRESH = 0.18
+BLINK_FRAMES = 3
+REQUIRED_BLINKS = 2
+REQUIRED_STABLE_FRAMES = 20   # face kam se kam itne frames dikhe
+MOVE_DELTA = 20               # center itna pixel move (full-frame pixels)
+STATE_TTL = 10.0              # seconds without a sighting before a track is dropped
+
+# head-movement pattern: center -> right -> left
+CENTER, RIGHT, LEFT = 0, 1, 2
+
+
+def eye_aspect_ratio(eye):
+    """EAR of a single eye given its 6 landmark points."""
+    A = np.linalg.norm(eye[1] - eye[5])
+    B = np.linalg.norm(eye[2] - eye[4])
+    C = np.linalg.norm(eye[0] - eye[3])
+    return (A + B) / (2.0 * C + 1e-6)
+
+
+def eye_aspect_ratios(eyes):
+    """
+    Vectorised EAR for many faces at once.
+    eyes: array of shape (N, 2, 6, 2) -> (left/right eye, 6 points, x/y).
+    Returns the mean EAR of both eyes for every face, shape (N,).
+    """
+    eyes = np.asarray(eyes, dtype=np.float32)
+    if eyes.size == 0:
+        return np.zeros(0, dtype=np.float32)
+    A = np.linalg.norm(eyes[:, :, 1] - eyes[:, :, 5], axis=-1)
+    B = np.linalg.norm(eyes[:, :, 2] - eyes[:, :, 4], axis=-1)
+    C = np.linalg.norm(eyes[:, :, 0] - eyes[:, :, 3], axis=-1)
+    return ((A + B) / (2.0 * C + 1e-6)).mean(axis=1)
+
+
+def eye_points(rgb_image, face_locations):
+    """
+    Eye landmarks for already detected faces, shape (N, 2, 6, 2).
+    Passing face_locations lets dlib skip a second detection pass.
+    """
+    import face_recognition
+
+    if len(face_locations) == 0:
+        return np.zeros((0, 2, 6, 2), dtype=np.float32)
+    landmarks = face_recognition.face_landmarks(rgb_image, face_locations=face_locations)
+    return np.array([[lm["left_eye"], lm["right_eye"]] for lm in landmarks], dtype=np.float32)
+
+
+class LivenessEngine:
+    """
+    Blink + head-movement (R->L) liveness check for many faces per frame.
+    Per-token state is kept in fixed-size NumPy arrays (one slot per track)
+    instead of five dicts; slots come from a TrackStore, so tracks not seen
+    for STATE_TTL seconds are freed and memory stays capped at `capacity`.
+    """
+
+    def __init__(self, capacity=64, ttl=STATE_TTL):
+        self.tracks = TrackStore(capacity, ttl)
+        self.blinks = np.zeros(capacity, dtype=np.int16)
+        self.blink_run = np.zeros(capacity, dtype=np.int16)
+        self.stable = np.zeros(capacity, dtype=np.int32)
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.last_cx = np.full(capacity, np.nan, dtype=np.float32)
+
+    def _clear(self, slots):
+        self.blinks[slots] = 0
+        self.blink_run[slots] = 0
+        self.stable[slots] = 0
+        self.state[slots] = CENTER
+        self.last_cx[slots] = np.nan
+
+    def _slot(self, token_no, now):
+        slot, is_new = self.tracks.touch(token_no, now)
+        if is_new:
+            self._clear(slot)
+        return slot
+
+    def update(self, token_nos, centers_x, ears, now):
+        """
+        Advance the liveness state machine for every matched face of a frame.
+        token_nos: list of matched tokens, centers_x: face centre x (full-frame px),
+        ears: EAR per face (NaN if landmarks are missing), now: timestamp.
+        Returns (live, blinks_needed) arrays aligned with token_nos.
+        """
+        self.tracks.expire(now)
+        if len(token_nos) == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int16)
+
+        slots = np.array([self._slot(t, now) for t in token_nos], dtype=np.intp)
+        cx = np.asarray(centers_x, dtype=np.float32)
+        ears = np.asarray(ears, dtype=np.float32)
+
+        # ---------- center & movement ----------
+        dx = np.nan_to_num(cx - self.last_cx[slots])
+        self.last_cx[slots] = cx
+        self.stable[slots] += 1
+
+        state = self.state[slots]
+        state = np.where((state == CENTER) & (dx >= MOVE_DELTA), RIGHT, state)
+        state = np.where((state == RIGHT) & (dx <= -MOVE_DELTA), LEFT, state)
+        self.state[slots] = state
+
+        # ---------- blink detection ----------
+        has_ear = ~np.isnan(ears)
+        closed = has_ear & (ears < BLINK_THRESH)
+        opened = has_ear & ~closed
+        run = self.blink_run[slots]
+        self.blinks[slots] += (opened & (run >= BLINK_FRAMES)).astype(np.int16)
+        self.blink_run[slots] = np.where(closed, run + 1, np.where(opened, 0, run))
+
+        # ---------- final liveness condition ----------
+        blinks = self.blinks[slots]
+        live = ((blinks >= REQUIRED_BLINKS) &
+                (self.state[slots] == LEFT) &
+                (self.stable[slots] >= REQUIRED_STABLE_FRAMES))
+        need = np.maximum(0, REQUIRED_BLINKS - blinks).astype(np.int16)
+        return live, need
+
+    def reset(self, token_no):
+        """Start the challenge again for token_no (after attendance is marked)."""
+        slot = self.tracks.slot_of.get(token_no)
+        if slot is not None:
+            self._clear(slot)
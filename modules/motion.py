@@ -0,0 +1,86 @@
+import numpy as np
+
+# Motion gate in front of face detection.
+#
+# HOG detection is the most expensive step of a frame and an empty corridor
+# needs none of it. Each (already downscaled) frame is reduced to a coarse
+# grey grid and differenced against the previous one; detection runs only
+# when enough cells changed, and then only inside the changed region.
+# A keep-alive still runs a full detection every few seconds, and while faces
+# are in view every frame is detected so a person standing still at the gate
+# keeps getting confirmed.
+
+MOTION = {
+    "step": 4,            # grid = every 4th pixel of the recognition-sized frame
+    "threshold": 18,      # grey-level change that counts as motion
+    "min_changed": 0.002, # fraction of cells that must change
+    "margin": 0.15,       # region padding, fraction of frame size (faces are bigger than the moving pixels)
+    "keepalive": 2.0,     # seconds between detections on a static scene
+    "hold": 1.5,          # seconds to keep detecting every frame after faces were seen
+    "max_region": 0.6,    # a region covering more than this is detected as a whole frame
+}
+
+
+class MotionGate:
+
+    def __init__(self, **overrides):
+        self.cfg = dict(MOTION, **overrides)
+        self.previous = None
+        self.last_detect = float("-inf")
+        self.last_faces = float("-inf")
+        self.frames = 0
+        self.skipped = 0
+        self.partial = 0
+
+    def _grid(self, rgb):
+        s = self.cfg["step"]
+        small = rgb[::s, ::s]
+        # luma on the coarse grid only; a few microseconds for an 80x60 grid
+        return (small[..., 0].astype(np.float32) * 0.299 + small[..., 1] * 0.587 + small[..., 2] * 0.114)
+
+    def check(self, rgb, now):
+        """
+        Region of the frame to run detection on as (top, right, bottom, left),
+        or None to skip detection for this frame.
+        """
+        self.frames += 1
+        h, w = rgb.shape[:2]
+        full = (0, w, h, 0)
+        grid = self._grid(rgb)
+        previous, self.previous = self.previous, grid
+        if previous is None or previous.shape != grid.shape:
+            return self._detect(full, now)
+        changed = np.abs(grid - previous) > self.cfg["threshold"]
+
+        if now - self.last_faces < self.cfg["hold"] or now - self.last_detect >= self.cfg["keepalive"]:
+            return self._detect(full, now)
+        if changed.mean() < self.cfg["min_changed"]:
+            self.skipped += 1
+            return None
+
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        s = self.cfg["step"]
+        mh, mw = int(h * self.cfg["margin"]), int(w * self.cfg["margin"])
+        top, bottom = max(0, int(rows[0]) * s - mh), min(h, (int(rows[-1]) + 1) * s + mh)
+        left, right = max(0, int(cols[0]) * s - mw), min(w, (int(cols[-1]) + 1) * s + mw)
+        if (bottom - top) * (right - left) > self.cfg["max_region"] * h * w:
+            return self._detect(full, now)
+        self.partial += 1
+        return self._detect((top, right, bottom, left), now)
+
+    def _detect(self, region, now):
+        self.last_detect = now
+        return region
+
+    def saw_faces(self, count, now):
+        if count:
+            self.last_faces = now
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "partial": self.partial,
+            "skipped_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+        }
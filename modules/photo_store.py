@@ -0,0 +1,88 @@
+import os
+import hashlib
+
+# Originals are stored once per distinct image (content hash), capped in size,
+# with thumbnails generated at upload time so list pages never touch originals.
+# students.photo_hash is part of the storage schema (modules/storage.py).
+MAX_SIDE = 800
+THUMB_SIZES = (64, 160)
+JPEG_QUALITY = 90
+
+
+def original_path(known_dir, photo_hash):
+    return os.path.join(known_dir, f"{photo_hash}.jpg")
+
+
+def thumb_path(known_dir, photo_hash, size):
+    return os.path.join(known_dir, "thumbs", f"{photo_hash}_{size}.jpg")
+
+
+def _fit(img, max_side):
+    import cv2
+
+    h, w = img.shape[:2]
+    f = max_side / float(max(h, w))
+    if f >= 1.0:
+        return img
+    return cv2.resize(img, (max(1, int(w * f)), max(1, int(h * f))), interpolation=cv2.INTER_AREA)
+
+
+def store_photo(data, known_dir):
+    """
+    Store uploaded image bytes. Identical uploads map to the same file, so
+    nothing is written twice. Returns (photo_hash, path of the capped original).
+    """
+    import cv2
+    import numpy as np
+
+    photo_hash = hashlib.sha256(data).hexdigest()[:20]
+    path = original_path(known_dir, photo_hash)
+    if os.path.exists(path) and all(os.path.exists(thumb_path(known_dir, photo_hash, s)) for s in THUMB_SIZES):
+        return photo_hash, path
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Uploaded photo is not a valid image.")
+
+    os.makedirs(os.path.join(known_dir, "thumbs"), exist_ok=True)
+    cv2.imwrite(path, _fit(img, MAX_SIDE), [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    for size in THUMB_SIZES:
+        cv2.imwrite(thumb_path(known_dir, photo_hash, size), _fit(img, size),
+                    [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return photo_hash, path
+
+
+def set_student_photo(storage, token_no, photo_hash, path):
+    storage.set_student_photo(token_no, photo_hash, path)
+
+
+def remove_if_unreferenced(storage, known_dir, photo_hash):
+    """Delete the stored files for photo_hash unless another student still uses them."""
+    if not photo_hash or storage.photo_in_use(photo_hash):
+        return
+    paths = [original_path(known_dir, photo_hash)] + [thumb_path(known_dir, photo_hash, s) for s in THUMB_SIZES]
+    for p in paths:
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+
+
+def backfill_photos(storage, known_dir):
+    """Move students registered before the photo store (photo_hash NULL) into it."""
+    moved = 0
+    for token_no, old_path in storage.students_without_photo_hash():
+        if not old_path or not os.path.exists(old_path):
+            continue
+        try:
+            with open(old_path, "rb") as f:
+                photo_hash, path = store_photo(f.read(), known_dir)
+            set_student_photo(storage, token_no, photo_hash, path)
+            if os.path.abspath(old_path) != os.path.abspath(path):
+                os.remove(old_path)
+            moved += 1
+        except Exception as e:
+            print(f"⚠️ Could not move photo {old_path}: {e}")
+    if moved:
+        print(f"🖼️ Moved {moved} student photos into the photo store.")
+    return moved
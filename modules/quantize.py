@@ -0,0 +1,170 @@
+import numpy as np
+
+# Gallery search indexes used by RecognitionEngine._match.
+#   "float32": exact search (half the memory of the old float64 lists)
+#   "float16": 2 bytes/dim, approximate search + exact re-rank
+#   "int8":    1 byte/dim with a calibrated per-dimension scale, + exact re-rank
+RERANK_K = 5
+CHUNK_ROWS = 8192   # bounds the temporary float32 block while scanning an int8/float16 gallery
+
+
+def _top2(d, rows=None):
+    """(best row, best distance, runner-up distance) per row of a distance matrix."""
+    n = np.arange(len(d))
+    if d.shape[1] < 2:
+        b = d.argmin(axis=1)
+        second = np.full(len(d), np.inf)
+    else:
+        two = np.argpartition(d, 1, axis=1)[:, :2]
+        b, other = two[:, 0], two[:, 1]
+        second = d[n, other].astype(np.float64)
+    best = b if rows is None else np.asarray(rows)[b]
+    return best, d[n, b].astype(np.float64), second
+
+
+def _l2(probes, gallery, gallery_sq):
+    """All probe-to-gallery distances via |p|^2 + |g|^2 - 2 p.g (one matmul, no P x N x D temporary)."""
+    p2 = (probes * probes).sum(axis=1)[:, None]
+    return np.sqrt(np.maximum(p2 + gallery_sq[None, :] - 2.0 * (probes @ gallery.T), 0.0))
+
+
+class ExactIndex:
+    """Plain float32 L2 search."""
+
+    def __init__(self, encodings):
+        self.matrix = np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1)
+        self.sq_norms = (self.matrix * self.matrix).sum(axis=1)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def nbytes(self):
+        return self.matrix.nbytes + self.sq_norms.nbytes
+
+    def search(self, probes, rows=None):
+        """
+        Best row (gallery index), its distance and the runner-up distance (for
+        the match margin; inf with a single row) per probe, from one scan.
+        rows restricts the search.
+        """
+        probes = np.asarray(probes, dtype=np.float32)
+        if rows is None:
+            d = _l2(probes, self.matrix, self.sq_norms)
+        else:
+            d = _l2(probes, self.matrix[rows], self.sq_norms[rows])
+        return _top2(d, rows)
+
+
+class QuantizedIndex:
+    """
+    int8 / float16 gallery. Candidates come from the compact codes via
+    |p - q*s|^2 = |p|^2 + |q*s|^2 - 2 (p*s).q, then the top RERANK_K are
+    re-scored exactly against float32 rows of `exact`: the gallery snapshot
+    itself (by default `encodings`, no copy is kept), so with the shared
+    np.memmap gallery only the few re-ranked rows are ever paged in.
+    """
+
+    def __init__(self, encodings, mode="int8", exact=None, rerank_k=RERANK_K):
+        enc = np.asarray(encodings, dtype=np.float32).reshape(len(encodings), -1)
+        self.mode = mode
+        self.rerank_k = rerank_k
+        if mode == "int8":
+            # calibration: symmetric per-dimension scale from the gallery's own range
+            self.scale = np.maximum(np.abs(enc).max(axis=0), 1e-6) / 127.0
+            self.codes = np.clip(np.rint(enc / self.scale), -127, 127).astype(np.int8)
+        elif mode == "float16":
+            self.scale = np.ones(enc.shape[1], dtype=np.float32)
+            self.codes = enc.astype(np.float16)
+        else:
+            raise ValueError(f"Unknown quantisation mode: {mode}")
+        deq = self.codes.astype(np.float32) * self.scale
+        self.sq_norms = (deq * deq).sum(axis=1)
+        self.exact = encodings if exact is None else exact
+
+    def __len__(self):
+        return len(self.codes)
+
+    def nbytes(self, include_exact=False):
+        n = self.codes.nbytes + self.scale.nbytes + self.sq_norms.nbytes
+        if include_exact and not isinstance(self.exact, np.memmap):
+            n += sum(np.asarray(e).nbytes for e in self.exact) if isinstance(self.exact, list) else self.exact.nbytes
+        return n
+
+    def _exact_rows(self, rows):
+        if isinstance(self.exact, np.ndarray):
+            return np.asarray(self.exact[rows], dtype=np.float32)
+        return np.asarray([self.exact[r] for r in rows], dtype=np.float32)   # list snapshot
+
+    def approx_distances(self, probes, rows=None):
+        probes = np.asarray(probes, dtype=np.float32)
+        codes = self.codes if rows is None else self.codes[rows]
+        norms = self.sq_norms if rows is None else self.sq_norms[rows]
+        ps = probes * self.scale
+        p2 = (probes * probes).sum(axis=1)[:, None]
+        out = np.empty((len(probes), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), CHUNK_ROWS):
+            block = codes[start:start + CHUNK_ROWS].astype(np.float32)
+            out[:, start:start + len(block)] = ps @ block.T
+        return np.sqrt(np.maximum(p2 + norms[None, :] - 2.0 * out, 0.0))
+
+    def search(self, probes, rows=None):
+        probes = np.asarray(probes, dtype=np.float32)
+        d = self.approx_distances(probes, rows)
+        k = min(self.rerank_k, d.shape[1])
+        cand = np.argpartition(d, k - 1, axis=1)[:, :k]
+        if rows is not None:
+            cand = np.asarray(rows)[cand]
+        best = np.empty(len(probes), dtype=np.intp)
+        best_d = np.empty(len(probes), dtype=np.float64)
+        second = np.empty(len(probes), dtype=np.float64)
+        for i, c in enumerate(np.sort(cand, axis=1)):   # sorted rows read a memmap sequentially
+            exact = np.linalg.norm(self._exact_rows(c).reshape(len(c), -1) - probes[i], axis=1)
+            b, bd, sd = _top2(exact[None, :], c)
+            best[i], best_d[i], second[i] = b[0], bd[0], sd[0]
+        return best, best_d, second
+
+
+def build_index(encodings, dtype="float32", exact=None):
+    """
+    Index for a gallery snapshot according to CONFIG["gallery_dtype"];
+    search(probes, rows=None) -> (best rows, distances, runner-up distances).
+    """
+    if dtype in ("int8", "float16"):
+        return QuantizedIndex(encodings, dtype, exact=exact)
+    return ExactIndex(encodings)
+
+
+def accuracy_report(encodings, probes=None, modes=("float16", "int8"), noise=0.03, seed=0):
+    """
+    Compare quantised search against full float64 precision.
+    Without probes, every gallery row plus Gaussian noise is used as a probe.
+    Returns {mode: {top1_agreement, max_abs_dist_error, approx_top1_agreement, bytes, bytes_float64}}.
+    """
+    gallery = np.asarray(encodings, dtype=np.float64).reshape(len(encodings), -1)
+    if probes is None:
+        rng = np.random.default_rng(seed)
+        probes = gallery + rng.normal(0, noise, gallery.shape)
+    probes = np.asarray(probes, dtype=np.float64)
+
+    g_sq = (gallery * gallery).sum(axis=1)
+    ref_best = np.empty(len(probes), dtype=np.intp)
+    ref_dist = np.empty(len(probes))
+    for start in range(0, len(probes), 256):
+        d = _l2(probes[start:start + 256], gallery, g_sq)
+        ref_best[start:start + len(d)] = d.argmin(axis=1)
+        ref_dist[start:start + len(d)] = d[np.arange(len(d)), ref_best[start:start + len(d)]]
+
+    report = {}
+    for mode in modes:
+        idx = QuantizedIndex(gallery, mode)
+        best, dist, _ = idx.search(probes)
+        approx_best = np.concatenate([idx.approx_distances(probes[s:s + 256]).argmin(axis=1)
+                                      for s in range(0, len(probes), 256)])
+        report[mode] = {
+            "top1_agreement": float((best == ref_best).mean()),
+            "approx_top1_agreement": float((approx_best == ref_best).mean()),
+            "max_abs_dist_error": float(np.abs(dist - ref_dist).max()),
+            "bytes": idx.nbytes(),
+            "bytes_float64": gallery.nbytes,
+        }
+    return report
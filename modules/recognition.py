@@ -0,0 +1,512 @@
+import os
+import csv
+import time
+import datetime
+from collections import deque
+import numpy as np
+from modules.liveness import LivenessEngine, eye_aspect_ratios, eye_points
+from modules.track_state import TrackStore
+from modules.attendance_policy import get_policy
+from modules.quantize import build_index
+from modules.detectors import make_detector
+from modules.face_quality import encode
+
+# ---------- Shared recognition settings (used by gen_frames and the webcam loop) ----------
+CONFIG = {
+    "scale": 0.5,                  # frame is resized by this factor before detection
+    "tolerance": 0.5,              # max face distance accepted as a match
+    "required_consecutive": 3,     # frames in a row before a match is confirmed
+    "stale_after": 5.0,            # seconds after which a half-confirmed track is dropped
+    "max_tracks": 256,             # per-camera cap on simultaneously tracked identities
+    "gallery_dtype": "float32",    # "float32" exact, or "float16" / "int8" quantised + exact re-rank
+    "detector": "hog",             # modules/detectors.py spec, e.g. "haar", "yunet", "cascade:haar>hog"
+    "false_accept": 1e-4,          # EvidencePolicy: target rate of confirming the wrong student
+    "false_reject": 0.01,          # EvidencePolicy: target rate of giving up on the right one
+}
+
+# BGR colours used when drawing results
+GREEN = (0, 255, 0)
+YELLOW = (0, 200, 200)
+RED = (0, 0, 255)
+
+
+def attendance_status(time_str, day=None):
+    """'On Time' / 'Late' for a HH:MM:SS mark, using the shared late-cutoff policy."""
+    return get_policy().status(time_str, day or datetime.date.today().isoformat())
+
+
+# ---------- Attendance sinks ----------
+class StorageSink:
+    """Writes marks into the attendance table of a storage backend (one row per token per day)."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def mark(self, token_no, name, day, time_str, status):
+        return self.storage.mark_attendance(token_no, name, day, time_str, status)
+
+
+class CSVSink:
+    """
+    Appends marks to attendance_data/attendance_<day>.csv.
+    The file is read once per day to learn who is already marked; after that
+    every mark is a single appended line instead of a full pandas rewrite.
+    If the file grew behind our back (another worker or loop appending to the
+    same day), it is read again before deciding.
+    """
+
+    def __init__(self, folder_path="attendance_data"):
+        self.folder_path = folder_path
+        self.day = None
+        self.names = set()
+        self.size = 0
+
+    def _path(self, day):
+        return os.path.join(self.folder_path, f"attendance_{day}.csv")
+
+    def _load_day(self, day):
+        os.makedirs(self.folder_path, exist_ok=True)
+        self.day = day
+        self.names = set()
+        path = self._path(day)
+        if not os.path.exists(path):
+            with open(path, "w", newline="") as f:
+                csv.writer(f).writerow(["Name", "Time", "Status"])
+        else:
+            with open(path, newline="") as f:
+                self.names = {row["Name"] for row in csv.DictReader(f)}
+        self.size = os.path.getsize(path)
+
+    def mark(self, token_no, name, day, time_str, status):
+        path = self._path(day)
+        if day != self.day or not os.path.exists(path) or os.path.getsize(path) != self.size:
+            self._load_day(day)
+        if name in self.names:
+            return False
+        with open(path, "a", newline="") as f:
+            csv.writer(f).writerow([name, time_str, status])
+        self.names.add(name)
+        self.size = os.path.getsize(path)
+        return True
+
+
+# ---------- Confirmation policies ----------
+class ConsecutivePolicy:
+    """Confirm a token after N matching frames; counts decay after stale_after seconds."""
+
+    def __init__(self, required=None, stale_after=None, capacity=None):
+        self.required = required or CONFIG["required_consecutive"]
+        capacity = capacity or CONFIG["max_tracks"]
+        self.tracks = TrackStore(capacity, stale_after or CONFIG["stale_after"])
+        self.counts = np.zeros(capacity, dtype=np.int32)
+
+    def update(self, matches, rgb_small, now):
+        self.tracks.expire(now)
+        results = []
+        for m in matches:
+            slot, is_new = self.tracks.touch(m["token_no"], now)
+            self.counts[slot] = 1 if is_new else self.counts[slot] + 1
+            count = int(self.counts[slot])
+            results.append((count >= self.required, f"{m['name']} ({count})"))
+        return results
+
+    def reset(self, token_no):
+        slot = self.tracks.slot_of.get(token_no)
+        if slot is not None:
+            self.counts[slot] = 0
+
+
+class EvidencePolicy:
+    """
+    Sequential probability ratio test per track. Each frame adds the log-
+    likelihood ratio of its match distance (and margin to the runner-up)
+    under "same person" vs "different person" Gaussians; a track is confirmed
+    once the sum reaches log((1 - false_reject) / false_accept) and restarted
+    when it drops to log(false_reject / (1 - false_accept)). A 0.25 match
+    confirms in one frame, a borderline 0.48 needs many.
+    The default distributions are typical of dlib's 128-d encodings; fit them
+    to your own cameras for accurate error rates.
+    """
+
+    needs_margin = True
+
+    def __init__(self, false_accept=None, false_reject=None, genuine=(0.35, 0.07), impostor=(0.62, 0.06),
+                 margin_genuine=(0.25, 0.10), margin_impostor=(0.05, 0.08), stale_after=None, capacity=None):
+        false_accept = false_accept or CONFIG["false_accept"]
+        false_reject = false_reject or CONFIG["false_reject"]
+        self.accept_at = float(np.log((1.0 - false_reject) / false_accept))
+        self.reject_at = float(np.log(false_reject / (1.0 - false_accept)))
+        self.genuine, self.impostor = genuine, impostor
+        self.margin_genuine, self.margin_impostor = margin_genuine, margin_impostor
+        capacity = capacity or CONFIG["max_tracks"]
+        self.tracks = TrackStore(capacity, stale_after or CONFIG["stale_after"])
+        self.llr = np.zeros(capacity, dtype=np.float64)
+
+    @staticmethod
+    def _log_ratio(x, same, other):
+        (m1, s1), (m0, s0) = same, other
+        return (np.log(s0 / s1) - (x - m1) ** 2 / (2 * s1 * s1) + (x - m0) ** 2 / (2 * s0 * s0))
+
+    def evidence(self, distances, margins=None):
+        """Per-frame log-likelihood ratios (vectorised)."""
+        distances = np.asarray(distances, dtype=np.float64)
+        llr = self._log_ratio(distances, self.genuine, self.impostor)
+        if margins is not None:
+            # a margin beyond the typical genuine one is no extra evidence (and inf = only one student)
+            margins = np.minimum(np.asarray(margins, dtype=np.float64), self.margin_genuine[0])
+            llr += self._log_ratio(margins, self.margin_genuine, self.margin_impostor)
+        return llr
+
+    def update(self, matches, rgb_small, now):
+        self.tracks.expire(now)
+        if not matches:
+            return []
+        margins = [m["margin"] for m in matches] if all("margin" in m for m in matches) else None
+        gains = self.evidence([m["distance"] for m in matches], margins)
+        results = []
+        for m, gain in zip(matches, gains):
+            slot, is_new = self.tracks.touch(m["token_no"], now)
+            total = (0.0 if is_new else self.llr[slot]) + gain
+            if total <= self.reject_at:
+                total = 0.0            # evidence says someone else: start over
+            self.llr[slot] = total
+            progress = int(100 * max(0.0, min(1.0, total / self.accept_at)))
+            results.append((total >= self.accept_at, f"{m['name']} ({progress}%)"))
+        return results
+
+    def reset(self, token_no):
+        slot = self.tracks.slot_of.get(token_no)
+        if slot is not None:
+            self.llr[slot] = 0.0
+
+
+class LivenessPolicy:
+    """Confirm a token once it has passed the blink + R->L head-movement challenge."""
+
+    def __init__(self, engine=None):
+        self.engine = engine or LivenessEngine(capacity=CONFIG["max_tracks"])
+
+    def update(self, matches, rgb_small, now):
+        if not matches:
+            self.engine.update([], [], [], now)
+            return []
+        if all(m.get("landmarks") is not None and m["landmarks"]["model"] == "large" for m in matches):
+            # the quality gate's 68-point landmarks: no second landmark pass
+            eyes = np.array([[m["landmarks"]["left_eye"], m["landmarks"]["right_eye"]] for m in matches],
+                            dtype=np.float32)
+        else:
+            eyes = eye_points(rgb_small, [m["loc"] for m in matches])
+        ears = eye_aspect_ratios(eyes)
+        centers_x = [(m["box"][1] + m["box"][3]) // 2 for m in matches]
+        live, need = self.engine.update([m["token_no"] for m in matches], centers_x, ears, now)
+        return [(bool(ok), f"{m['name']}: blink {n} more & move R->L")
+                for m, ok, n in zip(matches, live, need)]
+
+    def reset(self, token_no):
+        self.engine.reset(token_no)
+
+
+class AllOf:
+    """Confirm only when every wrapped policy confirms."""
+
+    def __init__(self, *policies):
+        self.policies = policies
+        self.needs_margin = any(getattr(p, "needs_margin", False) for p in policies)
+
+    def update(self, matches, rgb_small, now):
+        per_policy = [p.update(matches, rgb_small, now) for p in self.policies]
+        results = []
+        for votes in zip(*per_policy):
+            ok = all(v[0] for v in votes)
+            pending = [v[1] for v in votes if not v[0]]
+            results.append((ok, pending[-1] if pending else votes[-1][1]))
+        return results
+
+    def reset(self, token_no):
+        for p in self.policies:
+            p.reset(token_no)
+
+
+# ---------- Worker lifecycle: warm-up, buffers, latency ----------
+_warm = False
+
+
+def warm_up(width=640, height=480, scale=None):
+    """
+    Load the dlib models and run every stage once on a dummy frame, so the
+    first real frame (first student of the morning) doesn't pay for it.
+    Safe to call more than once; only the first call does any work.
+    """
+    global _warm
+    if _warm:
+        return 0.0
+    start = time.perf_counter()
+    import face_recognition
+
+    scale = scale or CONFIG["scale"]
+    h, w = int(height * scale), int(width * scale)
+    dummy = np.random.default_rng(0).integers(0, 255, (h, w, 3), dtype=np.uint8)
+    box = [(h // 4, 3 * w // 4, 3 * h // 4, w // 4)]
+    face_recognition.face_locations(dummy)
+    # a fake box forces the shape predictors and the 128-d encoder to run too
+    face_recognition.face_encodings(dummy, box)
+    face_recognition.face_landmarks(dummy, face_locations=box)
+    _warm = True
+    elapsed = time.perf_counter() - start
+    print(f"🔥 Recognition models warmed up in {elapsed * 1000:.0f} ms")
+    return elapsed
+
+
+def is_warm():
+    return _warm
+
+
+class FrameBuffers:
+    """Reusable resize / RGB buffers; reallocated only when the frame size changes."""
+
+    def __init__(self, scale):
+        self.scale = scale
+        self.src_shape = None
+        self.rgb = None
+
+    def prepare(self, frame):
+        """Downscale + BGR->RGB into the same preallocated buffer; returns it."""
+        import cv2
+
+        if frame.shape != self.src_shape:
+            self.src_shape = frame.shape
+            h, w = int(frame.shape[0] * self.scale), int(frame.shape[1] * self.scale)
+            self.rgb = np.empty((h, w, 3), dtype=np.uint8)
+        h, w = self.rgb.shape[:2]
+        cv2.resize(frame, (w, h), dst=self.rgb, interpolation=cv2.INTER_LINEAR)
+        cv2.cvtColor(self.rgb, cv2.COLOR_BGR2RGB, dst=self.rgb)   # in place
+        return self.rgb
+
+
+class LatencyStats:
+    """First-frame latency kept apart from a rolling window of steady-state latencies."""
+
+    def __init__(self, window=300):
+        self.first_frame_ms = None
+        self.frames = 0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.frames += 1
+        if self.first_frame_ms is None:
+            self.first_frame_ms = ms
+        else:
+            self.recent.append(ms)
+
+    def report(self):
+        steady = np.array(self.recent) if self.recent else None
+        return {
+            "frames": self.frames,
+            "first_frame_ms": None if self.first_frame_ms is None else round(self.first_frame_ms, 1),
+            "steady_p50_ms": None if steady is None else round(float(np.percentile(steady, 50)), 1),
+            "steady_p95_ms": None if steady is None else round(float(np.percentile(steady, 95)), 1),
+            "steady_mean_ms": None if steady is None else round(float(steady.mean()), 1),
+        }
+
+
+# ---------- Engine ----------
+class RecognitionEngine:
+    """
+    Detect -> encode -> match -> confirm -> mark, for one camera.
+    get_gallery returns (encodings, token_nos, names) and is called every frame,
+    so callers can swap the gallery (e.g. after a registration) at any time.
+    Marks go to every sink; the first sink decides whether a mark is new.
+    With a shard_router, each frame searches the camera's current shard first.
+    With an unknown_sink (modules/unknown_faces.py), unmatched faces are kept
+    with their encoding instead of being thrown away.
+    With a motion_gate (modules/motion.py), detection is skipped on static
+    frames and limited to the moving region otherwise. The face detector is
+    pluggable (modules/detectors.py); CONFIG["detector"] picks the default.
+    With a quality_gate (modules/face_quality.py), only faces passing the
+    size / sharpness / brightness / pose checks are encoded, the gate's
+    landmarks are reused by the encoder / liveness check, and an unknown face
+    keeps its best-scoring crop.
+    """
+
+    def __init__(self, get_gallery, sinks, policy=None, scale=None, tolerance=None, late_policy=None,
+                 shard_router=None, get_members=None, unknown_sink=None, motion_gate=None,
+                 detector=None, quality_gate=None):
+        self.get_gallery = get_gallery
+        self.sinks = list(sinks)
+        self.policy = policy or ConsecutivePolicy()
+        self.scale = scale or CONFIG["scale"]
+        self.tolerance = tolerance or CONFIG["tolerance"]
+        self.late_policy = late_policy   # None -> the shared policy from attendance_policy
+        self.marked_day = None
+        self.marked = set()
+        self._gallery_key = None
+        self._gallery_index = None
+        self.shard_router = shard_router   # camera schedule -> shard to search first
+        self.get_members = get_members     # shard -> set of token_nos
+        self.unknown_sink = unknown_sink
+        self.motion_gate = motion_gate
+        self.detector = detector or make_detector(CONFIG["detector"])
+        self.quality_gate = quality_gate
+        self._shard_key = None
+        self._shard_cache = None
+        self.buffers = FrameBuffers(self.scale)
+        self.latency = LatencyStats()
+
+    def _index(self, encodings):
+        # build the search index once per gallery object instead of once per face;
+        # quantised indexes re-rank against the snapshot (the shared mmap) instead of a copy
+        if self._gallery_key is not encodings:
+            self._gallery_key = encodings
+            self._gallery_index = build_index(encodings, CONFIG["gallery_dtype"], exact=encodings)
+        return self._gallery_index
+
+    def _shard_rows(self, token_nos, shard):
+        """Gallery row indices of a shard's members, cached per gallery snapshot."""
+        if self._shard_key is None or self._shard_key[0] is not token_nos or self._shard_key[1] != shard:
+            members = self.get_members(shard)
+            self._shard_key = (token_nos, shard)
+            self._shard_cache = np.array([i for i, t in enumerate(token_nos) if t in members], dtype=np.intp)
+        return self._shard_cache
+
+    def _match(self, probes, encodings, token_nos, shard=None):
+        """
+        Best gallery row, distance and runner-up distance for every probe.
+        With a shard, only the shard's rows are searched first; probes with no
+        match inside the shard fall back to the whole gallery. The runner-up
+        comes from the same scan as the match (the margin is within the shard
+        for a shard match).
+        """
+        index = self._index(encodings)
+        best = np.zeros(len(probes), dtype=np.intp)
+        best_dists = np.full(len(probes), np.inf)
+        runner_up = np.full(len(probes), np.inf)
+        todo = np.arange(len(probes))
+        if shard is not None and self.get_members is not None:
+            rows = self._shard_rows(token_nos, shard)
+            if len(rows) > 0:
+                best, best_dists, runner_up = index.search(probes, rows)
+                todo = np.flatnonzero(best_dists > self.tolerance)
+        if len(todo) > 0:
+            best[todo], best_dists[todo], runner_up[todo] = index.search(probes[todo])
+        return best, best_dists, runner_up
+
+    def _mark(self, token_no, name, now_dt):
+        day = now_dt.date().isoformat()
+        if day != self.marked_day:
+            self.marked_day = day
+            self.marked = set()
+        if token_no in self.marked:
+            return False
+        time_str = now_dt.strftime("%H:%M:%S")
+        policy = self.late_policy or get_policy()
+        # per-class cutoffs: the class the camera is running now, else the student's own class shard
+        current = self.shard_router.current(now_dt) if self.shard_router else None
+        status = policy.status(time_str, day, policy.class_of(token_no, self.get_members, current))
+        is_new = False
+        for i, sink in enumerate(self.sinks):
+            try:
+                ok = sink.mark(token_no, name, day, time_str, status)
+            except Exception as e:
+                print(f"❌ {type(sink).__name__} mark failed: {e}")
+                continue
+            if i == 0:
+                is_new = ok
+        self.marked.add(token_no)
+        if is_new:
+            print(f"✅ Inserted attendance: {token_no} | {name} | {status} | {time_str}")
+        return is_new
+
+    def _detect_in(self, rgb, region):
+        """Detect faces in one region of the frame, in whole-frame coordinates."""
+        top, right, bottom, left = region
+        if (top, left) == (0, 0) and (bottom, right) == rgb.shape[:2]:
+            return self.detector.detect(rgb)
+        crop = np.ascontiguousarray(rgb[top:bottom, left:right])
+        return [(t + top, r + left, b + top, l + left)
+                for t, r, b, l in self.detector.detect(crop)]
+
+    def process(self, frame, now_dt=None):
+        """
+        Run recognition on one BGR frame. Returns a list of result dicts:
+        {"box", "status", "label", "token_no", "name", "distance"} where status is
+        "no_gallery", "unknown", "pending", "marked" or "already".
+        """
+        start = time.perf_counter()
+        results = self._process(frame, now_dt or datetime.datetime.now())
+        self.latency.add(time.perf_counter() - start)
+        return results
+
+    def _process(self, frame, now_dt):
+        now = now_dt.timestamp()
+        inv = 1.0 / self.scale
+
+        rgb_small = self.buffers.prepare(frame)
+        if self.motion_gate is None:
+            face_locations = self.detector.detect(rgb_small)
+        else:
+            region = self.motion_gate.check(rgb_small, now)
+            if region is None:
+                return []
+            face_locations = self._detect_in(rgb_small, region)
+            self.motion_gate.saw_faces(len(face_locations), now)
+        results = []
+        scores = marks = None
+        if self.quality_gate is not None:
+            face_locations, scores, marks, rejects = self.quality_gate.filter(rgb_small, face_locations)
+            for loc, reason in rejects:
+                results.append({"box": tuple(int(v * inv) for v in loc), "status": "low_quality", "label": reason})
+        face_encodings = encode(rgb_small, face_locations, marks)
+
+        encodings, token_nos, names = self.get_gallery()
+        matches = []
+        if len(face_encodings) > 0 and len(encodings) > 0:
+            shard = self.shard_router.current(now_dt) if self.shard_router else None
+            best, best_dists, runner_up = self._match(np.asarray(face_encodings, dtype=np.float64),
+                                                      encodings, token_nos, shard)
+        for i, loc in enumerate(face_locations):
+            box = tuple(int(v * inv) for v in loc)
+            if len(encodings) == 0:
+                results.append({"box": box, "status": "no_gallery", "label": "No known faces loaded"})
+                continue
+            best_distance = float(best_dists[i])
+            if best_distance > self.tolerance:
+                results.append({"box": box, "status": "unknown", "distance": best_distance,
+                                "label": f"Unknown ({best_distance:.2f})"})
+                if self.unknown_sink is not None:
+                    self.unknown_sink.add(face_encodings[i], frame, box, now,
+                                          quality=scores[i] if scores is not None else None)
+                continue
+            m = {"box": box, "loc": loc, "token_no": token_nos[best[i]], "name": names[best[i]],
+                 "distance": best_distance, "landmarks": marks[i] if marks else None,
+                 "margin": float(runner_up[i]) - best_distance}
+            matches.append(m)
+            results.append(m)
+
+        for m, (confirmed, label) in zip(matches, self.policy.update(matches, rgb_small, now)):
+            m.pop("loc")
+            m.pop("landmarks")
+            m.pop("margin")
+            if not confirmed:
+                m["status"], m["label"] = "pending", label
+                continue
+            if self._mark(m["token_no"], m["name"], now_dt):
+                m["status"], m["label"] = "marked", f"{m['name']} ✅ Attendance marked!"
+            else:
+                m["status"], m["label"] = "already", m["name"]
+            self.policy.reset(m["token_no"])
+        return results
+
+
+def draw_results(frame, results):
+    """Draw boxes + labels for engine results onto the full-size frame."""
+    import cv2
+
+    colours = {"no_gallery": YELLOW, "unknown": RED, "pending": YELLOW, "marked": GREEN, "already": GREEN,
+               "low_quality": YELLOW}
+    for r in results:
+        top, right, bottom, left = r["box"]
+        colour = colours[r["status"]]
+        cv2.rectangle(frame, (left, top), (right, bottom), colour, 2)
+        cv2.putText(frame, r["label"], (left, top - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, colour, 2)
+    return frame
@@ -0,0 +1,38 @@
+import time
+from modules.attendance_policy import WEEKDAYS
+
+
+def parse_shards(text):
+    """'CS-A, Block 2' -> ['CS-A', 'Block 2'] (form input -> shard names)."""
+    return sorted({s.strip() for s in (text or "").split(",") if s.strip()})
+
+
+class ShardRouter:
+    """
+    Which gallery shard a camera should search first right now, from its
+    schedule in the camera_shards table (e.g. room 101 -> "CS-A" on Mon 09:00-10:00).
+    The schedule is re-read every `reload_every` seconds, not per frame.
+    """
+
+    def __init__(self, storage, camera_id, reload_every=60.0):
+        self.storage = storage
+        self.camera_id = camera_id
+        self.reload_every = reload_every
+        self._schedule = []
+        self._loaded_at = 0.0
+
+    def current(self, now_dt):
+        if time.monotonic() - self._loaded_at > self.reload_every:
+            try:
+                self._schedule = self.storage.camera_schedule(self.camera_id)
+            except Exception as e:
+                print(f"⚠️ Could not load schedule for camera {self.camera_id}: {e}")
+            self._loaded_at = time.monotonic()
+        weekday = WEEKDAYS[now_dt.weekday()]
+        now_str = now_dt.strftime("%H:%M:%S")
+        for entry in self._schedule:
+            if entry["weekday"] not in (None, "", weekday):
+                continue
+            if entry["start"] <= now_str <= entry["end"]:
+                return entry["shard"]
+        return None
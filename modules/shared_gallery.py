@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import numpy as np
+
+# One copy of the gallery for all worker processes on a box.
+#
+#   <dir>/CURRENT             generation number of the live gallery
+#   <dir>/gallery-<gen>.npy   float32 (N, 128) matrix, mapped read-only by every worker
+#   <dir>/gallery-<gen>.json  token_nos, names and shard memberships
+#
+# The generation is the storage gallery version. Only the worker that wins
+# publish.lock reads the gallery from the DB and writes a new generation;
+# the others keep using the mapping they have and pick the new one up from
+# CURRENT, so registrations don't trigger a reload in every worker.
+
+LOCK_STALE_AFTER = 60.0   # seconds; a lock older than this was left by a crashed worker
+
+
+class SharedGallery:
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.generation = None
+        self.matrix = None
+        self.meta = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def current_generation(self):
+        try:
+            with open(self._path("CURRENT")) as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _acquire(self):
+        lock = self._path("publish.lock")
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > LOCK_STALE_AFTER:
+                    os.remove(lock)
+                    return self._acquire()
+            except FileNotFoundError:
+                return self._acquire()
+            return False
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+
+    def _release(self):
+        try:
+            os.remove(self._path("publish.lock"))
+        except FileNotFoundError:
+            pass
+
+    def publish(self, generation, encodings, token_nos, names, members):
+        """Write a new generation (tmp file + rename) and point CURRENT at it."""
+        matrix = np.asarray(encodings, dtype=np.float32)
+        if len(token_nos) == 0:
+            matrix = np.zeros((0, 128), dtype=np.float32)
+        npy = self._path(f"gallery-{generation}.npy")
+        tmp = npy + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp, npy)
+        meta = {"token_nos": list(token_nos), "names": list(names),
+                "members": {k: sorted(v) for k, v in members.items()}}
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path(f"gallery-{generation}.json"))
+        with open(tmp, "w") as f:
+            f.write(str(generation))
+        os.replace(tmp, self._path("CURRENT"))
+        self._cleanup(keep={generation, self.generation})
+
+    def _cleanup(self, keep):
+        for fn in os.listdir(self.directory):
+            if not fn.startswith("gallery-"):
+                continue
+            try:
+                gen = int(fn[len("gallery-"):].split(".")[0])
+            except ValueError:
+                continue
+            if gen not in keep:
+                try:
+                    os.remove(self._path(fn))   # workers still mapping it keep their pages (POSIX)
+                except OSError:
+                    pass
+
+    def attach(self, generation):
+        """Map a published generation read-only."""
+        matrix = np.load(self._path(f"gallery-{generation}.npy"), mmap_mode="r")
+        with open(self._path(f"gallery-{generation}.json")) as f:
+            meta = json.load(f)
+        self.matrix, self.meta, self.generation = matrix, meta, generation
+
+    def sync(self, storage):
+        """
+        Make sure we map the generation matching storage's gallery version,
+        publishing it first if nobody has. Returns True if the mapping changed.
+        """
+        wanted = storage.gallery_version()
+        current = self.current_generation()
+        if current != wanted and self._acquire():
+            try:
+                if self.current_generation() != wanted:
+                    encs, ids, names, version = storage.load_gallery()
+                    self.publish(version, encs, ids, names, storage.shard_memberships())
+                    print(f"📤 Published shared gallery generation {version} ({len(ids)} encodings)")
+            finally:
+                self._release()
+            current = self.current_generation()
+        if current is None or current == self.generation:
+            return False
+        try:
+            self.attach(current)
+        except FileNotFoundError:
+            return False        # superseded while we were opening it; next sync catches up
+        return True
@@ -0,0 +1,39 @@
+import time
+
+# (step, seconds) in the order the steps ran
+STARTUP_TIMINGS = []
+_T0 = time.perf_counter()
+
+
+class timed:
+    """Context manager that records how long a startup step took."""
+
+    def __init__(self, step):
+        self.step = step
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STARTUP_TIMINGS.append((self.step, time.perf_counter() - self.start))
+        return False
+
+
+def record(step, seconds):
+    """Record a step that was timed elsewhere (e.g. in a background thread)."""
+    STARTUP_TIMINGS.append((step, seconds))
+
+
+def startup_report():
+    """Startup-time breakdown as a JSON-friendly dict."""
+    return {
+        "steps": [{"step": s, "ms": round(sec * 1000, 1)} for s, sec in STARTUP_TIMINGS],
+        "since_import_ms": round((time.perf_counter() - _T0) * 1000, 1),
+    }
+
+
+def print_startup_report():
+    print("⏱️ Startup breakdown:")
+    for step, sec in STARTUP_TIMINGS:
+        print(f"   {step:<32} {sec * 1000:8.1f} ms")
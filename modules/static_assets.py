@@ -0,0 +1,159 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+
+# Static asset pipeline.
+#
+# At boot every file in static/ is copied to <build>/ under a content-hashed
+# name (style.css -> style.3f2a9c1e0b7d.css) and text assets also get .gz and
+# .br (if the brotli package is installed) siblings. Templates keep writing
+# url_for('static', filename='style.css'); the app rewrites that to the hashed
+# name, and hashed URLs are served with a one-year immutable Cache-Control,
+# so a browser asks for an asset once per content change instead of once per
+# page view. Requests for the plain name (old links, the .txt pages) still
+# work and revalidate with an ETag. Each response carries the smallest
+# encoding the client accepts.
+
+COMPRESSIBLE = (".css", ".js", ".txt", ".svg", ".html", ".json", ".map")
+HASH_LEN = 12
+MAX_AGE = 31536000
+
+
+def _fingerprint(name, digest):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest}{ext}"
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _accepted(accept_encoding):
+    """{coding: q} from an Accept-Encoding header; q=0 means refused."""
+    out = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for p in params:
+            key, _, value = p.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        out[coding.lower()] = q
+    return out
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+class StaticAssets:
+
+    def __init__(self, source_dir, build_dir):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.hashed = {}      # logical name -> fingerprinted name
+        self.logical = {}     # fingerprinted name -> logical name
+        self.etags = {}       # logical name -> content hash
+        self.encodings = {}   # logical name -> ["br", "gz"] variants present in build_dir
+
+    def build(self):
+        """Fingerprint and precompress everything under source_dir. Returns the number of assets."""
+        br = _brotli()
+        os.makedirs(self.build_dir, exist_ok=True)
+        keep = set()
+        for root, _, files in os.walk(self.source_dir):
+            for fn in files:
+                src = os.path.join(root, fn)
+                name = os.path.relpath(src, self.source_dir).replace(os.sep, "/")
+                with open(src, "rb") as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:HASH_LEN]
+                hashed = _fingerprint(name, digest)
+                out = os.path.join(self.build_dir, hashed)
+                os.makedirs(os.path.dirname(out), exist_ok=True)
+                variants = []
+                if not os.path.exists(out):
+                    _write_atomic(out, data)
+                if name.lower().endswith(COMPRESSIBLE):
+                    for enc, compress in (("br", br and (lambda d: br.compress(d, quality=11))),
+                                          ("gz", lambda d: gzip.compress(d, 9, mtime=0))):
+                        if compress is None:
+                            continue
+                        if not os.path.exists(f"{out}.{enc}"):
+                            packed = compress(data)
+                            if len(packed) >= len(data) * 0.9:
+                                continue      # not worth a Content-Encoding
+                            _write_atomic(f"{out}.{enc}", packed)
+                        variants.append(enc)
+                        keep.add(f"{hashed}.{enc}")
+                keep.add(hashed)
+                self.hashed[name] = hashed
+                self.logical[hashed] = name
+                self.etags[name] = digest
+                self.encodings[name] = variants
+        self._cleanup(keep)
+        return len(self.hashed)
+
+    def _cleanup(self, keep):
+        """Drop builds of assets that have since changed (pages are no-store, so nothing links them)."""
+        for root, _, files in os.walk(self.build_dir):
+            for fn in files:
+                rel = os.path.relpath(os.path.join(root, fn), self.build_dir).replace(os.sep, "/")
+                if rel not in keep and not fn.endswith(".tmp"):
+                    os.remove(os.path.join(root, fn))
+
+    def url_name(self, name):
+        """Fingerprinted name for url_for('static', ...); unknown files keep their name."""
+        return self.hashed.get(name, name)
+
+    def serve(self, filename, accept_encoding=""):
+        """
+        Response for /static/<filename>: the build output for known assets
+        (immutable if the URL is fingerprinted), the source file otherwise.
+        """
+        from flask import send_file, send_from_directory
+
+        name = self.logical.get(filename)
+        immutable = name is not None
+        name = name or filename
+        if name not in self.hashed:
+            return send_from_directory(self.source_dir, filename, max_age=0)
+
+        path = os.path.join(self.build_dir, self.hashed[name])
+        etag = self.etags[name]
+        encoding = None
+        accepted = _accepted(accept_encoding)
+        best_q = 0.0
+        for enc, token in (("br", "br"), ("gz", "gzip")):   # br wins a tie
+            q = accepted.get(token, accepted.get("*", 0.0))
+            if enc in self.encodings[name] and q > best_q:
+                best_q, encoding, variant = q, token, enc
+        if encoding:
+            path, etag = f"{path}.{variant}", f"{etag}-{variant}"
+        mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        # download_name: a saved file is style.css, not the .gz/.br it was sent from
+        resp = send_file(path, mimetype=mimetype, conditional=True, etag=etag,
+                         download_name=os.path.basename(name), max_age=MAX_AGE if immutable else 0)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+        if self.encodings[name]:
+            resp.vary.add("Accept-Encoding")
+        resp.cache_control.public = True
+        if immutable:
+            resp.cache_control.immutable = True
+        else:
+            resp.cache_control.no_cache = True
+        return resp
@@ -1,49 +1,98 @@
 import sqlite3
 import os
+from modules.photo_store import remove_if_unreferenced
 
-def get_all_students(db_path):
+# Students live in the storage backend (modules/storage.py), so these work
+# the same on the default SQLite file and on PostgreSQL.
+
+def get_all_students(storage):
     """Fetch all students sorted by name."""
+    return storage.all_students()
+
+
+def ensure_student_indexes(db_path):
+    """
+    SQLite only: indexes for the paginated roster, plus an FTS5 index over
+    name/token_no kept in sync by triggers. Returns True if FTS5 is available.
+    """
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
-    cur.execute("SELECT token_no, name, photo_path FROM students ORDER BY name ASC")
-    rows = cur.fetchall()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_students_name_token ON students(name, token_no)")
+    has_fts = True
+    try:
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='students_fts'")
+        created = cur.fetchone() is None
+        cur.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+            name, token_no, content='students', content_rowid='id', prefix='1 2 3'
+        )
+        """)
+        cur.executescript("""
+        CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN
+            INSERT INTO students_fts(rowid, name, token_no) VALUES (new.id, new.name, new.token_no);
+        END;
+        CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN
+            INSERT INTO students_fts(students_fts, rowid, name, token_no)
+            VALUES ('delete', old.id, old.name, old.token_no);
+        END;
+        CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE OF name, token_no ON students BEGIN
+            INSERT INTO students_fts(students_fts, rowid, name, token_no)
+            VALUES ('delete', old.id, old.name, old.token_no);
+            INSERT INTO students_fts(rowid, name, token_no) VALUES (new.id, new.name, new.token_no);
+        END;
+        """)
+        if created:
+            cur.execute("INSERT INTO students_fts(students_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ FTS5 search index unavailable, using LIKE search: {e}")
+        has_fts = False
+    conn.commit()
     conn.close()
-    return rows
+    return has_fts
+
 
+def list_students(storage, q=None, after=None, limit=50):
+    """
+    One page of students ordered by (name, token_no) using keyset pagination.
+    after: (name, token_no) of the last row of the previous page, or None.
+    q: optional prefix search on name / token_no.
+    Returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    limit = max(1, min(int(limit), 200))
+    rows = storage.students_page((q or "").strip() or None, after, limit + 1)
 
-def get_student(db_path, token_no):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1][1], rows[-1][0])
+    return rows, next_cursor
+
+
+def get_student(storage, token_no):
     """Fetch a single student by token_no."""
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    cur.execute("SELECT token_no, name, photo_path FROM students WHERE token_no=?", (token_no,))
-    r = cur.fetchone()
-    conn.close()
-    return r
+    row = storage.get_student(token_no)
+    return row[:3] if row else None
 
 
-def update_student(db_path, token_no, name):
+def update_student(storage, token_no, name):
     """Update student details by token_no."""
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    cur.execute("UPDATE students SET name=? WHERE token_no=?", (name, token_no))
-    conn.commit()
-    conn.close()
+    storage.rename_student(token_no, token_no, name)
 
 
-def delete_student(db_path, token_no, known_dir, enc_dir):
-    """Delete student by token_no and remove their files."""
-    # Remove DB entry
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    cur.execute("DELETE FROM students WHERE token_no=?", (token_no,))
-    conn.commit()
-    conn.close()
+def delete_student(storage, token_no, known_dir, enc_dir):
+    """Delete student by token_no (row, shards, gallery entry) and remove their files."""
+    # Look up the photo from the DB row (no directory scan), then remove DB entry
+    row = storage.get_student(token_no)
+    storage.delete_student(token_no)
 
-    # Remove photo file
-    for f in os.listdir(known_dir):
-        if f.startswith(token_no + "_"):
+    # Remove photo files (shared, deduplicated photos stay while still referenced)
+    if row:
+        _, _, photo_path, photo_hash = row
+        if photo_hash:
+            remove_if_unreferenced(storage, known_dir, photo_hash)
+        elif photo_path and os.path.exists(photo_path):
             try:
-                os.remove(os.path.join(known_dir, f))
+                os.remove(photo_path)
             except:
                 pass
 
@@ -0,0 +1,98 @@
+import heapq
+import datetime
+import numpy as np
+
+
+class TrackStore:
+    """
+    Fixed-capacity token -> slot map for per-camera tracking state.
+
+    Callers keep their own per-track values in arrays indexed by slot.
+    Expiry uses a min-heap of (last_seen, token) entries, so cleaning up
+    touches only the tracks that actually expired instead of scanning all of
+    them. Stale heap entries (token seen again later) are skipped lazily.
+    When the store is full the least recently seen track is evicted, and all
+    tracks are dropped when the calendar day changes.
+    """
+
+    def __init__(self, capacity=256, ttl=10.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.slot_of = {}                         # token_no -> slot
+        self.token_of = [None] * capacity         # slot -> token_no
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._heap = []
+        self._day = None
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    def __contains__(self, token_no):
+        return token_no in self.slot_of
+
+    def _release(self, token_no):
+        slot = self.slot_of.pop(token_no)
+        self.token_of[slot] = None
+        self._free.append(slot)
+        return slot
+
+    def _pop_oldest(self, before=None):
+        """Pop heap entries until a live one older than `before` is found (or the heap is empty)."""
+        while self._heap:
+            ts, token_no = self._heap[0]
+            slot = self.slot_of.get(token_no)
+            if slot is None or self.last_seen[slot] != ts:
+                heapq.heappop(self._heap)     # outdated entry
+                continue
+            if before is not None and ts >= before:
+                return None
+            heapq.heappop(self._heap)
+            return token_no
+        return None
+
+    def touch(self, token_no, now):
+        """Record a sighting. Returns (slot, is_new); is_new means the caller must reset the slot."""
+        slot = self.slot_of.get(token_no)
+        is_new = slot is None
+        if is_new:
+            if not self._free:
+                self._release(self._pop_oldest())
+            slot = self._free.pop()
+            self.slot_of[token_no] = slot
+            self.token_of[slot] = token_no
+        self.last_seen[slot] = now
+        heapq.heappush(self._heap, (now, token_no))
+        # keep outdated heap entries from piling up for always-visible tracks
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(self.last_seen[s], t) for t, s in self.slot_of.items()]
+            heapq.heapify(self._heap)
+        return slot, is_new
+
+    def expire(self, now):
+        """Drop tracks idle for more than ttl (and everything on a new day). Returns freed slots."""
+        day = datetime.date.fromtimestamp(now)
+        if day != self._day:
+            first_call = self._day is None
+            self._day = day
+            if first_call:
+                return self.expire(now)
+            freed = list(self.slot_of.values())
+            self.reset()
+            return freed
+        freed = []
+        token_no = self._pop_oldest(before=now - self.ttl)
+        while token_no is not None:
+            freed.append(self._release(token_no))
+            token_no = self._pop_oldest(before=now - self.ttl)
+        return freed
+
+    def drop(self, token_no):
+        if token_no in self.slot_of:
+            self._release(token_no)
+
+    def reset(self):
+        self.slot_of.clear()
+        self.token_of = [None] * self.capacity
+        self._free = list(range(self.capacity - 1, -1, -1))
+        self._heap = []
@@ -0,0 +1,145 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+
+# Faces the live feed could not match, grouped so a visitor who keeps coming
+# back shows up as one suggestion on /unknown instead of being thrown away.
+#
+# Leader clustering: an encoding joins the nearest cluster whose centroid is
+# within CLUSTER_RADIUS, otherwise it starts a new cluster. Centroids are
+# running means, so each add is one (clusters x 128) distance computation.
+# Everything is bounded: a cluster keeps at most MAX_SAMPLES encodings and
+# one crop, and the least recently seen cluster is dropped past MAX_CLUSTERS.
+
+CLUSTER_RADIUS = 0.45   # a little tighter than the match tolerance, so two people don't merge
+MAX_CLUSTERS = 100
+MAX_SAMPLES = 20
+SAMPLE_EVERY = 2.0      # seconds; a face standing in front of the camera is sampled, not added per frame
+CROP_MAX_SIDE = 320
+CROP_MARGIN = 0.25
+
+
+class UnknownCluster:
+
+    def __init__(self, cid, encoding, now):
+        self.id = cid
+        self.centroid = np.array(encoding, dtype=np.float64)
+        self.count = 1
+        self.samples = deque([self.centroid.copy()], maxlen=MAX_SAMPLES)
+        self.first_seen = self.last_seen = self.last_sample = now
+        self.crop = None
+        self.crop_rank = -1
+
+    def add(self, encoding, now):
+        self.last_seen = now
+        if now - self.last_sample < SAMPLE_EVERY:
+            return False
+        self.last_sample = now
+        self.count += 1
+        self.centroid += (encoding - self.centroid) / self.count
+        self.samples.append(np.array(encoding, dtype=np.float64))
+        return True
+
+    def encoding(self):
+        """Enrolment encoding: mean of the kept samples."""
+        return np.mean(np.asarray(self.samples), axis=0)
+
+    def summary(self):
+        return {"id": self.id, "count": self.count, "first_seen": self.first_seen,
+                "last_seen": self.last_seen, "has_crop": self.crop is not None,
+                "last_seen_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_seen))}
+
+
+def _crop(frame, box):
+    """Copy of the face (plus a margin) out of a full-size BGR frame, capped at CROP_MAX_SIDE."""
+    top, right, bottom, left = box
+    mh, mw = int((bottom - top) * CROP_MARGIN), int((right - left) * CROP_MARGIN)
+    h, w = frame.shape[:2]
+    crop = frame[max(0, top - mh):min(h, bottom + mh), max(0, left - mw):min(w, right + mw)]
+    if crop.size == 0:
+        return None
+    side = max(crop.shape[:2])
+    if side > CROP_MAX_SIDE:
+        import cv2
+
+        f = CROP_MAX_SIDE / float(side)
+        return cv2.resize(crop, (max(1, int(crop.shape[1] * f)), max(1, int(crop.shape[0] * f))),
+                          interpolation=cv2.INTER_AREA)
+    return crop.copy()   # the caller reuses / draws on the frame
+
+
+class UnknownFaces:
+    """Unknown-face sink for RecognitionEngine; thread-safe for the admin page."""
+
+    def __init__(self, radius=CLUSTER_RADIUS, max_clusters=MAX_CLUSTERS):
+        self.radius = radius
+        self.max_clusters = max_clusters
+        self._clusters = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._ids = []
+        self._centroids = np.empty((0, 128))
+
+    def __len__(self):
+        return len(self._clusters)
+
+    def _rebuild(self):
+        self._ids = list(self._clusters)
+        self._centroids = (np.asarray([c.centroid for c in self._clusters.values()])
+                           if self._clusters else np.empty((0, 128)))
+
+    def add(self, encoding, frame, box, now, quality=None):
+        """
+        Record one unmatched face (encoding from the hot path, box in frame
+        coordinates). The crop kept per cluster is the highest-quality one, or
+        the largest when no quality score is given.
+        """
+        encoding = np.asarray(encoding, dtype=np.float64)
+        with self._lock:
+            cluster = None
+            if len(self._ids):
+                d = np.linalg.norm(self._centroids - encoding, axis=1)
+                j = int(d.argmin())
+                if d[j] <= self.radius:
+                    cluster = self._clusters[self._ids[j]]
+            if cluster is None:
+                if len(self._clusters) >= self.max_clusters:
+                    oldest = min(self._clusters.values(), key=lambda c: c.last_seen)
+                    del self._clusters[oldest.id]
+                cluster = UnknownCluster(self._next_id, encoding, now)
+                self._clusters[cluster.id] = cluster
+                self._next_id += 1
+                self._rebuild()
+            elif cluster.add(encoding, now):
+                self._centroids[j] = cluster.centroid
+            rank = quality if quality is not None else (box[2] - box[0]) * (box[1] - box[3])
+            if rank > cluster.crop_rank:
+                crop = _crop(frame, box)
+                if crop is not None:
+                    cluster.crop, cluster.crop_rank = crop, rank
+            return cluster.id
+
+    def clusters(self, min_count=1):
+        """Summaries, most frequently seen first."""
+        with self._lock:
+            out = [c.summary() for c in self._clusters.values() if c.count >= min_count]
+        return sorted(out, key=lambda c: (-c["count"], -c["last_seen"]))
+
+    def get(self, cid):
+        with self._lock:
+            return self._clusters.get(cid)
+
+    def crop_jpeg(self, cid, quality=90):
+        import cv2
+
+        cluster = self.get(cid)
+        if cluster is None or cluster.crop is None:
+            return None
+        ok, buf = cv2.imencode(".jpg", cluster.crop, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buf.tobytes() if ok else None
+
+    def discard(self, cid):
+        with self._lock:
+            if self._clusters.pop(cid, None) is not None:
+                self._rebuild()
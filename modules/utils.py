@@ -23,7 +23,7 @@ def init_db(db_path):
     cur.execute("""
     CREATE TABLE IF NOT EXISTS students (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        token_no TEXT PRIMARY KEY,
+        token_no TEXT UNIQUE,
         name TEXT,
         photo_path TEXT,
         encoding_path TEXT
@@ -34,7 +34,7 @@ def init_db(db_path):
     cur.execute("""
     CREATE TABLE IF NOT EXISTS attendance (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        token_no TEXT PRIMARY KEY,
+        token_no TEXT,
         name TEXT,
         date TEXT,
         time TEXT,
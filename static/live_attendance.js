@@ -0,0 +1,60 @@
+// Applies live attendance events (/events/stream) to the page without reloading it.
+//   [data-live-counter="present_today"]  -> counter text (suffix from data-suffix)
+//   tbody[data-live-present]             -> a row is appended per new mark
+//   tbody[data-live-absent]              -> the student's row is removed
+// Only pages showing today's date (data-live-date on <body>) listen.
+(function () {
+  const day = document.body.dataset.liveDate;
+  if (!day || !window.EventSource) return;
+
+  function cell(text, cls) {
+    const td = document.createElement("td");
+    td.textContent = text;
+    if (cls) td.className = cls;
+    return td;
+  }
+
+  function addPresent(ev) {
+    document.querySelectorAll("tbody[data-live-present]").forEach(function (tbody) {
+      if (tbody.querySelector('tr[data-token="' + CSS.escape(ev.token_no) + '"]')) return;
+      const empty = tbody.querySelector("tr[data-empty]");
+      if (empty) empty.remove();
+      const tr = document.createElement("tr");
+      tr.dataset.token = ev.token_no;
+      tbody.dataset.livePresent.split(",").forEach(function (col) {
+        if (col === "status") {
+          tr.appendChild(cell(ev.status, ev.status === "Late" ? "status-late" : "status-ontime"));
+        } else if (col === "present") {
+          const td = document.createElement("td");
+          td.innerHTML = '<span class="badge bg-success">Present</span>';
+          tr.appendChild(td);
+        } else {
+          tr.appendChild(cell(ev[col]));
+        }
+      });
+      tbody.appendChild(tr);
+    });
+    document.querySelectorAll("tbody[data-live-absent]").forEach(function (tbody) {
+      const row = tbody.querySelector('tr[data-token="' + CSS.escape(ev.token_no) + '"]');
+      if (row) row.remove();
+    });
+  }
+
+  const source = new EventSource("/events/stream");
+  source.addEventListener("mark", function (e) {
+    const ev = JSON.parse(e.data);
+    if (ev.date === day) addPresent(ev);
+  });
+  source.addEventListener("counters", function (e) {
+    const c = JSON.parse(e.data);
+    if (c.date !== day) return;
+    document.querySelectorAll("[data-live-counter]").forEach(function (el) {
+      const v = c[el.dataset.liveCounter];
+      if (v !== undefined) el.textContent = v + (el.dataset.suffix || "");
+    });
+  });
+  source.addEventListener("resync", function () {
+    source.close();
+    window.location.reload();
+  });
+})();